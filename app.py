@@ -1,6 +1,26 @@
-from flask import Flask, render_template, request, redirect, flash, url_for, jsonify
-from utils.data_manager import load_data, issue_book, return_book, get_transaction_history
-from utils.analytics import calculate_kpis, generate_charts
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import pandas as pd
+from flask import (
+    Flask, render_template, request, redirect, flash, url_for, jsonify, abort, make_response,
+    stream_with_context, send_file, g, session, before_render_template, template_rendered,
+)
+from utils.data_manager import (
+    get_book, get_member,
+    page_books, page_members, suggest_books, suggest_members, issue_book, return_book, query_transactions,
+    add_books, add_members, issue_books, return_books,
+    data_version, vocabularies,
+)
+from utils.analytics import CHARTS, get_chart, get_charts, ANALYTICS, get_analytics
+from utils import aggregates, export, jobs, metrics, recommend, reports
 
 app = Flask(__name__)
 app.secret_key = 'super_secret_key_for_demo_mvp'
@@ -9,34 +29,200 @@ app.secret_key = 'super_secret_key_for_demo_mvp'
 DEPARTMENTS = ['Computer Science', 'Mechanical', 'Civil', 'Electronics', 'MBA']
 ROLES = ['Student', 'Faculty']
 
+# Dashboard charts: 'server' serves cached PNGs, 'client' draws them in the
+# browser from /api/analytics/* (override per request with ?charts=...)
+app.config.setdefault('DASHBOARD_CHART_MODE', 'server')
+# Threads used to re-render several dashboard charts in parallel (0 = inline)
+app.config.setdefault('CHART_WORKERS', 0)
+# Share of requests (0..1) answered with a Server-Timing header and logged
+# with their per-function timings; 0 turns request profiling off
+app.config.setdefault('PROFILE_SAMPLE_RATE', float(os.environ.get('LIBRARY_PROFILE_SAMPLE_RATE', 0)))
+if app.config['PROFILE_SAMPLE_RATE']:
+    app.logger.setLevel(logging.INFO)
+# Rendered read pages kept for conditional GET (see versioned); 0 = none
+app.config.setdefault('RENDER_CACHE_SIZE', 256)
+
+# --- Instrumentation (utils/metrics.py, exported at /metrics) ---
+@app.before_request
+def start_request_metrics():
+    metrics.begin_request()
+
+@app.after_request
+def record_request_metrics(response):
+    profile = metrics.end_request(request.method, request.endpoint or 'unmatched', response.status_code)
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    if profile is not None and rate and random.random() < rate:
+        response.headers['Server-Timing'] = metrics.profile_header(profile)
+        app.logger.info("profile %s", metrics.profile_line(
+            profile, request.method, request.full_path.rstrip('?'), response.status_code,
+        ))
+    return response
+
+@app.teardown_request
+def drop_request_metrics(error):
+    # Errors in views still reach record_request_metrics with the 500 response.
+    # This only catches an after_request function that raised before it ran
+    # (end_request is a no-op once the request has been recorded).
+    if error is not None:
+        metrics.end_request(request.method, request.endpoint or 'unmatched', 500)
+    metrics.discard_request()
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    g.template_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def record_template_timer(sender, template, context, **extra):
+    started = g.pop('template_started', None)
+    if started is not None:
+        metrics.observe(f'template.{template.name}', time.perf_counter() - started)
+
+@app.route('/metrics')
+def metrics_page():
+    response = make_response(metrics.render())
+    response.mimetype = 'text/plain'
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+# --- Conditional GET ---
+# Read routes are tagged with an ETag built from the data version
+# (data_manager.data_version) and today's date, since due dates and days
+# overdue move with it. A client sending back the ETag of its copy gets a
+# 304 while nothing changed, and a page already rendered for the current
+# version is served again without re-rendering it.
+_rendered_lock = threading.Lock()
+_rendered = OrderedDict()  # (path, etag) -> (mimetype, body)
+
+def versioned(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # Pages showing flashed messages are one-offs: neither tagged nor kept
+        if '_flashes' in session:
+            return view(*args, **kwargs)
+
+        etag = f'{data_version()}-{date.today():%Y%m%d}'
+        if request.if_none_match.contains_weak(etag):
+            metrics.inc('library_conditional_responses_total', result='not_modified')
+            response = app.response_class(status=304)
+        else:
+            key = (request.full_path, etag)
+            with _rendered_lock:
+                cached = _rendered.get(key)
+                if cached is not None:
+                    _rendered.move_to_end(key)
+            if cached is not None:
+                metrics.inc('library_conditional_responses_total', result='cached')
+                response = app.response_class(cached[1], mimetype=cached[0])
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed or session.modified:
+                    return response
+                metrics.inc('library_conditional_responses_total', result='rendered')
+                _keep_rendered(key, response)
+
+        response.set_etag(etag, weak=True)
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+def _keep_rendered(key, response):
+    size = app.config['RENDER_CACHE_SIZE']
+    if not size:
+        return
+    with _rendered_lock:
+        _rendered[key] = (response.mimetype, response.get_data())
+        # Entries of older versions are never asked for again
+        while len(_rendered) > size:
+            _rendered.popitem(last=False)
+
 @app.context_processor
 def inject_globals():
     """Inject global variables into all templates."""
-    books, members, _ = load_data()
-
-    departments = sorted(
-        set(books['Department'].dropna().astype(str).tolist())
-        | set(members['Department'].dropna().astype(str).tolist())
-    )
-    roles = sorted(members['Role'].dropna().astype(str).unique().tolist())
-
-    return {
-        'departments': departments,
-        'roles': roles
-    }
+    # Memoized per data version of the books and members tables
+    return vocabularies()
 
 @app.route('/')
+@versioned
 def dashboard():
-    books, members, transactions = load_data()
-    
-    # Calculate Metrics
-    kpis = calculate_kpis(books, members, transactions)
-    charts = generate_charts(books, transactions)
+    # Metrics come from the incrementally maintained counters
+    kpis = aggregates.kpis()
+    chart_mode = request.args.get('charts', app.config['DASHBOARD_CHART_MODE'])
+    if chart_mode not in ('server', 'client'):
+        chart_mode = 'server'
+    charts = chart_urls() if chart_mode == 'server' else {}
     
-    # Fetch History
-    history = get_transaction_history()
+    # Fetch the last 10 transactions (joined for just those rows)
+    history, _ = query_transactions(limit=10)
     
-    return render_template('dashboard.html', kpis=kpis, charts=charts, history=history[:10]) # Show last 10
+    return render_template(
+        'dashboard.html', kpis=kpis, charts=charts, chart_mode=chart_mode,
+        history=history,
+    )
+
+REPORT_ROWS = 100  # overdue loans listed on /reports; the CSV export has all of them
+
+def records(df):
+    """DataFrame -> list of dicts for a template, with None for missing values."""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+@app.route('/reports')
+def reports_page():
+    from utils.data_manager import LOAN_PERIOD_DAYS, DEFAULT_LOAN_PERIOD_DAYS
+    durations = [
+        ('Loan Durations by Department', 'durations-by-department', 'Department'),
+        ('Loan Durations by Role', 'durations-by-role', 'Role'),
+    ]
+    return render_template(
+        'reports.html',
+        summary=reports.summary(),
+        aging=list(reports.aging_buckets().items()),
+        top_borrowed=records(reports.top_borrowed(10)),
+        durations=[
+            (title, name, records(reports.loan_durations(group).reset_index()), group)
+            for title, name, group in durations
+        ],
+        overdue=records(reports.overdue_loans().head(REPORT_ROWS)),
+        loan_periods=LOAN_PERIOD_DAYS,
+        default_loan_period=DEFAULT_LOAN_PERIOD_DAYS,
+    )
+
+@app.route('/reports/<name>.csv')
+def report_csv(name):
+    if name not in reports.REPORTS:
+        abort(404)
+    response = make_response(reports.to_csv(name))
+    response.mimetype = 'text/csv'
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.csv'
+    return response
+
+def chart_urls():
+    """URLs of the cached dashboard charts (None when a chart is empty)."""
+    urls = {}
+    charts = get_charts(list(CHARTS), workers=app.config['CHART_WORKERS'])
+    for name, chart in charts.items():
+        # The ETag in the URL lets browsers cache each rendering forever
+        urls[name] = url_for('chart_image', name=name, v=chart['etag']) if chart else None
+    return urls
+
+@app.route('/charts/<name>.png')
+def chart_image(name):
+    if name not in CHARTS:
+        abort(404)
+    chart = get_chart(name)
+    if chart is None:
+        abort(404)
+
+    response = make_response(chart['png'])
+    response.mimetype = 'image/png'
+    response.set_etag(chart['etag'])
+    response.last_modified = chart['last_modified']
+    if request.args.get('v') == chart['etag']:
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/issue', methods=['GET', 'POST'])
 def issue_page():
@@ -53,12 +239,10 @@ def issue_page():
             flash(message, 'danger')
             return redirect(url_for('issue_page'))
     
-    # GET request: Load available books for reference
-    books, _, _ = load_data()
-    available_ids = books[books['Status'] == 'Available']['BookID'].tolist()
+    # GET request: the form looks books and members up via /api/suggest/*
     prefill_book_id = request.args.get('book_id', '').strip()
     
-    return render_template('issue_book.html', available_ids=available_ids, prefill_book_id=prefill_book_id)
+    return render_template('issue_book.html', prefill_book_id=prefill_book_id)
 
 @app.route('/return', methods=['GET', 'POST'])
 def return_page():
@@ -74,11 +258,7 @@ def return_page():
             flash(message, 'danger')
             return redirect(url_for('return_page'))
     
-    # GET request: Load issued books for reference
-    books, _, _ = load_data()
-    issued_ids = books[books['Status'] == 'Issued']['BookID'].tolist()
-    
-    return render_template('return_book.html', issued_ids=issued_ids)
+    return render_template('return_book.html')
 
 @app.route('/add_book', methods=['GET', 'POST'])
 def add_book_page():
@@ -119,99 +299,132 @@ def add_member_page():
             
     return render_template('add_member.html')
 
+IMPORTERS = {'books': add_books, 'members': add_members}
+
+def read_upload(upload):
+    """Reads an uploaded .csv or .json file into a list of row dicts."""
+    if upload.filename.lower().endswith('.json'):
+        rows = json.load(upload.stream)
+    else:
+        rows = pd.read_csv(upload.stream, dtype=str, keep_default_na=False).to_dict('records')
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ValueError("Expected a list of records.")
+    return rows
+
+@app.route('/import', methods=['GET', 'POST'])
+def import_page():
+    failures = []
+    if request.method == 'POST':
+        table = request.form.get('table')
+        upload = request.files.get('file')
+        if table not in IMPORTERS or upload is None or not upload.filename:
+            flash("Choose what to import and a CSV or JSON file.", 'danger')
+            return redirect(url_for('import_page'))
+        try:
+            rows = read_upload(upload)
+        except (ValueError, pd.errors.ParserError):
+            flash("Could not read the file: use a CSV with a header row or a JSON list of records.", 'danger')
+            return redirect(url_for('import_page'))
+
+        added, failures = IMPORTERS[table](rows)
+        flash(f"Imported {len(added)} of {len(rows)} {table}.", 'success' if added else 'warning')
+        if not failures:
+            return redirect(url_for(f'{table}_page'))
+
+    return render_template('import.html', failures=failures)
+
 @app.route('/books')
+@versioned
 def books_page():
-    books, _, _ = load_data()
-    
     # Filter by query params if provided
     search_query = request.args.get('q', '', type=str).strip()
     department_filter = request.args.get('department', '', type=str).strip()
     status_filter = request.args.get('status')
 
-    if search_query:
-        search_mask = (
-            books['BookID'].astype(str).str.contains(search_query, case=False, na=False)
-            | books['Title'].astype(str).str.contains(search_query, case=False, na=False)
-            | books['Author'].astype(str).str.contains(search_query, case=False, na=False)
-            | books['Department'].astype(str).str.contains(search_query, case=False, na=False)
-        )
-        books = books[search_mask]
-
-    if department_filter:
-        books = books[books['Department'] == department_filter]
-
-    if status_filter:
-        books = books[books['Status'] == status_filter]
-    
-    # Pagination
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    total = len(books)
-    start = (page - 1) * per_page
-    end = start + per_page
-    
-    paginated_books = books.iloc[start:end].to_dict('records')
-    
-    has_next = end < total
-    has_prev = page > 1
+    # Pagination (cached filtered result; ?after= / ?before= page by key)
+    result = page_books(
+        search_query, department=department_filter, status=status_filter,
+        **page_args(),
+    )
         
     return render_template(
         'books.html',
-        books=paginated_books,
+        books=result['rows'],
         filter=status_filter,
         query=search_query,
         department_filter=department_filter,
-        page=page,
-        has_next=has_next,
-        has_prev=has_prev,
+        pagination=result,
+        page=result['page'],
+        has_next=result['has_next'],
+        has_prev=result['has_prev'],
     )
 
+def page_args():
+    """Paging arguments shared by the list pages."""
+    return {
+        'page': request.args.get('page', 1, type=int),
+        'per_page': 20,
+        'after': request.args.get('after', '', type=str).strip() or None,
+        'before': request.args.get('before', '', type=str).strip() or None,
+    }
+
 @app.route('/members')
+@versioned
 def members_page():
-    _, members, _ = load_data()
-
     search_query = request.args.get('q', '', type=str).strip()
     role_filter = request.args.get('role', '', type=str).strip()
     department_filter = request.args.get('department', '', type=str).strip()
 
-    if search_query:
-        search_mask = (
-            members['MemberID'].astype(str).str.contains(search_query, case=False, na=False)
-            | members['Name'].astype(str).str.contains(search_query, case=False, na=False)
-            | members['Role'].astype(str).str.contains(search_query, case=False, na=False)
-            | members['Department'].astype(str).str.contains(search_query, case=False, na=False)
-        )
-        members = members[search_mask]
-
-    if role_filter:
-        members = members[members['Role'] == role_filter]
-
-    if department_filter:
-        members = members[members['Department'] == department_filter]
-    
-    # Pagination
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    total = len(members)
-    start = (page - 1) * per_page
-    end = start + per_page
-    
-    paginated_members = members.iloc[start:end].to_dict('records')
-    
-    has_next = end < total
-    has_prev = page > 1
+    result = page_members(
+        search_query, role=role_filter, department=department_filter,
+        **page_args(),
+    )
     
     return render_template(
         'members.html',
-        members=paginated_members,
+        members=result['rows'],
         query=search_query,
         role_filter=role_filter,
         department_filter=department_filter,
-        page=page,
-        has_next=has_next,
-        has_prev=has_prev,
+        pagination=result,
+        page=result['page'],
+        has_next=result['has_next'],
+        has_prev=result['has_prev'],
     )
 
+# --- Exports ---
+# Streamed in chunks: memory use does not grow with the table and the first
+# bytes go out before the whole export is produced.
+def export_filters():
+    """Filters of the list pages and /api/transactions, for the export routes."""
+    args = request.args
+    return {
+        'query': args.get('q', '', type=str).strip(),
+        'department': args.get('department', '', type=str).strip(),
+        'status': args.get('status', '', type=str).strip(),
+        'role': args.get('role', '', type=str).strip(),
+        'member_id': args.get('member') or None,
+        'book_id': args.get('book') or None,
+        'action': args.get('action') or None,
+        'date_from': args.get('from') or None,
+        'date_to': args.get('to') or None,
+    }
+
+@app.route('/export/<table>.<fmt>')
+def export_table(table, fmt):
+    if table not in export.EXPORTS or fmt not in export.FORMATS:
+        abort(404)
+    columns, start = export.EXPORTS[table]
+    try:
+        chunks = start(export_filters())
+    except ValueError:
+        return jsonify({'error': 'Dates must be given as YYYY-MM-DD.'}), 400
+    response = app.response_class(
+        stream_with_context(export.encode(chunks, fmt, columns)), mimetype=export.FORMATS[fmt],
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={table}.{fmt}'
+    return response
+
 @app.route('/delete/book/<book_id>', methods=['POST'])
 def delete_book_route(book_id):
     from utils.data_manager import delete_book
@@ -232,44 +445,182 @@ def delete_member_route(member_id):
         flash(msg, 'danger')
     return redirect(url_for('members_page'))
 
+RECOMMENDATIONS = 5  # books suggested on a member's page
+
 @app.route('/member/<member_id>')
+@versioned
 def member_details(member_id):
-    _, members, _ = load_data()
-    member = members[members['MemberID'] == member_id]
+    member = get_member(member_id)
     
-    if member.empty:
+    if member is None:
         flash('Member not found', 'danger')
         return redirect(url_for('members_page'))
         
     from utils.data_manager import get_member_history, get_member_current_loans
     history = get_member_history(member_id)
     current_loans = get_member_current_loans(member_id)
+    recommendations = recommend.for_member(member_id, limit=RECOMMENDATIONS)
     
     return render_template(
         'member_details.html',
-        member=member.iloc[0].to_dict(),
+        member=member,
         history=history,
         current_loans=current_loans,
+        recommendations=recommendations,
         current_loans_count=len(current_loans),
+        borrowed_count=aggregates.member_circulation(member_id),
         history_count=len(history),
     )
 
 # --- API Endpoints ---
 @app.route('/api/book/<book_id>')
+@versioned
 def api_get_book(book_id):
-    books, _, _ = load_data()
-    book = books[books['BookID'] == book_id]
-    if not book.empty:
-        return jsonify(book.iloc[0].to_dict())
+    book = get_book(book_id)
+    if book is not None:
+        return jsonify({**book, 'TimesIssued': aggregates.book_circulation(book_id)})
     return jsonify({}), 404
 
+@app.route('/api/book/<book_id>/also-borrowed')
+@versioned
+def api_book_also_borrowed(book_id):
+    if get_book(book_id) is None:
+        return jsonify({}), 404
+    limit = max(1, min(request.args.get('limit', recommend.TOP_K, type=int), recommend.TOP_K))
+    return jsonify({'BookID': book_id, 'also_borrowed': recommend.also_borrowed(book_id, limit)})
+
 @app.route('/api/member/<member_id>')
+@versioned
 def api_get_member(member_id):
-    _, members, _ = load_data()
-    member = members[members['MemberID'] == member_id]
-    if not member.empty:
-        return jsonify(member.iloc[0].to_dict())
+    member = get_member(member_id)
+    if member is not None:
+        return jsonify({**member, 'BooksBorrowed': aggregates.member_circulation(member_id)})
     return jsonify({}), 404
 
+SUGGEST_LIMIT = 20
+
+def suggest_limit():
+    """Parses ?limit= for the suggest endpoints (1..SUGGEST_LIMIT, default 10)."""
+    limit = request.args.get('limit', 10, type=int)
+    return max(1, min(limit, SUGGEST_LIMIT))
+
+@app.route('/api/suggest/books')
+def api_suggest_books():
+    status = request.args.get('status', '').strip() or None
+    return jsonify(suggest_books(request.args.get('q', ''), status=status, limit=suggest_limit()))
+
+@app.route('/api/suggest/members')
+def api_suggest_members():
+    role = request.args.get('role', '').strip() or None
+    return jsonify(suggest_members(request.args.get('q', ''), role=role, limit=suggest_limit()))
+
+BATCH_LIMIT = 10000
+
+def batch_items():
+    """The JSON list posted to a batch endpoint (a bare list or {"items": [...]})."""
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('items')
+    if not isinstance(payload, list):
+        abort(make_response(jsonify({'error': 'Expected a JSON list of items.'}), 400))
+    if len(payload) > BATCH_LIMIT:
+        abort(make_response(jsonify({'error': f'At most {BATCH_LIMIT} items per batch.'}), 413))
+    return payload
+
+def batch_records():
+    items = batch_items()
+    if not all(isinstance(item, dict) for item in items):
+        abort(make_response(jsonify({'error': 'Every item must be an object.'}), 400))
+    return items
+
+@app.route('/api/books/batch', methods=['POST'])
+def api_add_books():
+    added, failures = add_books(batch_records())
+    return jsonify({'added': added, 'failed': failures})
+
+@app.route('/api/members/batch', methods=['POST'])
+def api_add_members():
+    added, failures = add_members(batch_records())
+    return jsonify({'added': added, 'failed': failures})
+
+@app.route('/api/issue/batch', methods=['POST'])
+def api_issue_books():
+    issued, failures = issue_books(batch_records())
+    return jsonify({'issued': issued, 'failed': failures})
+
+@app.route('/api/return/batch', methods=['POST'])
+def api_return_books():
+    # Accepts plain BookIDs or objects with a BookID
+    book_ids = [item.get('BookID') if isinstance(item, dict) else item for item in batch_items()]
+    returned, failures = return_books(book_ids)
+    return jsonify({'returned': returned, 'failed': failures})
+
+TRANSACTIONS_LIMIT = 100
+
+@app.route('/api/transactions')
+def api_transactions():
+    args = request.args
+    limit = max(1, min(args.get('limit', 20, type=int), TRANSACTIONS_LIMIT))
+    try:
+        records, cursor = query_transactions(
+            limit=limit,
+            offset=max(0, args.get('offset', 0, type=int)),
+            before=args.get('before') or None,
+            member_id=args.get('member') or None,
+            book_id=args.get('book') or None,
+            action=args.get('action') or None,
+            date_from=args.get('from') or None,
+            date_to=args.get('to') or None,
+        )
+    except ValueError:
+        return jsonify({'error': 'Dates must be given as YYYY-MM-DD.'}), 400
+    return jsonify({'transactions': records, 'next': cursor})
+
+# --- Background jobs (utils/jobs.py) ---
+JOBS_LIMIT = 200
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def api_jobs():
+    if request.method == 'POST':
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'error': 'Send a JSON object: {"task": ..., "params": {...}}.'}), 400
+        try:
+            job = jobs.submit(payload.get('task'), payload.get('params') or {})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(job), 202, {'Location': url_for('api_job', job_id=job['id'])}
+
+    state = request.args.get('state') or None
+    if state is not None and state not in jobs.STATES:
+        return jsonify({'error': f"state must be one of {', '.join(jobs.STATES)}."}), 400
+    limit = max(1, min(request.args.get('limit', 50, type=int), JOBS_LIMIT))
+    tasks = {name: {'params': task['params'], 'description': task['description']}
+             for name, task in jobs.TASKS.items()}
+    return jsonify({'jobs': jobs.list_jobs(limit, state), 'tasks': tasks})
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/download')
+def api_job_download(job_id):
+    job = jobs.get(job_id)
+    if job is None or job['state'] != 'done' or not (job['result'] or {}).get('file'):
+        abort(404)
+    path = jobs.JOBS_DIR / job['result']['file']
+    if not path.exists():
+        abort(404)
+    return send_file(path, as_attachment=True, download_name=job['result']['filename'])
+
+@app.route('/api/analytics/<name>')
+def api_analytics(name):
+    if name not in ANALYTICS:
+        return jsonify({}), 404
+    return jsonify(get_analytics(name))
+
 if __name__ == '__main__':
     app.run(debug=True)
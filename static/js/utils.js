@@ -42,3 +42,143 @@ async function copyToClipboard(text) {
         return false;
     }
 }
+
+/**
+ * Prepare a canvas for crisp drawing on high-DPI screens
+ * @param {HTMLCanvasElement} canvas - Target canvas
+ * @returns {{ctx: CanvasRenderingContext2D, width: number, height: number}}
+ */
+function setupCanvas(canvas) {
+    const ratio = window.devicePixelRatio || 1;
+    const width = canvas.clientWidth || canvas.width;
+    const height = canvas.clientHeight || canvas.height;
+    canvas.width = width * ratio;
+    canvas.height = height * ratio;
+    const ctx = canvas.getContext('2d');
+    ctx.scale(ratio, ratio);
+    ctx.clearRect(0, 0, width, height);
+    ctx.font = '11px Inter, sans-serif';
+    return { ctx, width, height };
+}
+
+/**
+ * Draw value axis with gridlines and return the plotting area
+ * @param {CanvasRenderingContext2D} ctx - Drawing context
+ * @param {number} width - Canvas width
+ * @param {number} height - Canvas height
+ * @param {number} maxValue - Largest value to plot
+ * @returns {{left: number, top: number, right: number, bottom: number, scale: Function}}
+ */
+function drawValueAxis(ctx, width, height, maxValue) {
+    const area = { left: 36, top: 12, right: width - 12, bottom: height - 70 };
+    const top = Math.max(1, Math.ceil(maxValue));
+    const steps = Math.min(top, 5);
+    ctx.strokeStyle = '#e5e7eb';
+    ctx.fillStyle = '#3d5a6c';
+    ctx.textAlign = 'right';
+    ctx.textBaseline = 'middle';
+    for (let i = 0; i <= steps; i++) {
+        const value = Math.round((top * i) / steps);
+        const y = area.bottom - ((area.bottom - area.top) * value) / top;
+        ctx.beginPath();
+        ctx.moveTo(area.left, y);
+        ctx.lineTo(area.right, y);
+        ctx.stroke();
+        ctx.fillText(value, area.left - 6, y);
+    }
+    area.scale = (value) => area.bottom - ((area.bottom - area.top) * value) / top;
+    return area;
+}
+
+/**
+ * Draw a rotated category label under the x axis
+ * @param {CanvasRenderingContext2D} ctx - Drawing context
+ * @param {string} label - Label text
+ * @param {number} x - Label anchor x
+ * @param {number} y - Label anchor y
+ */
+function drawAxisLabel(ctx, label, x, y) {
+    const text = label.length > 18 ? label.slice(0, 17) + '…' : label;
+    ctx.save();
+    ctx.translate(x, y + 6);
+    ctx.rotate(-Math.PI / 4);
+    ctx.textAlign = 'right';
+    ctx.textBaseline = 'middle';
+    ctx.fillText(text, 0, 0);
+    ctx.restore();
+}
+
+/**
+ * Draw a bar chart on a canvas
+ * @param {HTMLCanvasElement} canvas - Target canvas
+ * @param {{labels: string[], values: number[]}} data - Chart data
+ * @param {string} color - Bar color
+ */
+function drawBarChart(canvas, data, color = '#6366f1') {
+    const { ctx, width, height } = setupCanvas(canvas);
+    const area = drawValueAxis(ctx, width, height, Math.max(0, ...data.values));
+    const slot = (area.right - area.left) / Math.max(1, data.values.length);
+    data.values.forEach((value, i) => {
+        const x = area.left + slot * i + slot * 0.15;
+        const y = area.scale(value);
+        ctx.fillStyle = color;
+        ctx.fillRect(x, y, slot * 0.7, area.bottom - y);
+        ctx.fillStyle = '#3d5a6c';
+        drawAxisLabel(ctx, data.labels[i], x + slot * 0.35, area.bottom);
+    });
+}
+
+/**
+ * Draw a line chart (with point markers) on a canvas
+ * @param {HTMLCanvasElement} canvas - Target canvas
+ * @param {{labels: string[], values: number[]}} data - Chart data
+ * @param {string} color - Line color
+ */
+function drawLineChart(canvas, data, color = 'green') {
+    const { ctx, width, height } = setupCanvas(canvas);
+    const area = drawValueAxis(ctx, width, height, Math.max(0, ...data.values));
+    const count = data.values.length;
+    const step = count > 1 ? (area.right - area.left) / (count - 1) : 0;
+    const labelEvery = Math.max(1, Math.ceil(count / 10));
+    const points = data.values.map((value, i) => [area.left + step * i, area.scale(value)]);
+
+    ctx.strokeStyle = color;
+    ctx.lineWidth = 2;
+    ctx.beginPath();
+    points.forEach(([x, y], i) => (i ? ctx.lineTo(x, y) : ctx.moveTo(x, y)));
+    ctx.stroke();
+
+    points.forEach(([x, y], i) => {
+        ctx.fillStyle = color;
+        ctx.beginPath();
+        ctx.arc(x, y, 3, 0, 2 * Math.PI);
+        ctx.fill();
+        if (i % labelEvery === 0) {
+            ctx.fillStyle = '#3d5a6c';
+            drawAxisLabel(ctx, data.labels[i], x, area.bottom);
+        }
+    });
+}
+
+/**
+ * Fetch chart data from /api/analytics/<name> and draw it on a canvas.
+ * The canvas declares what to draw via data-chart, data-kind and data-color.
+ * @param {HTMLCanvasElement} canvas - Target canvas
+ */
+async function renderChart(canvas) {
+    try {
+        const res = await fetch(`/api/analytics/${canvas.dataset.chart}`);
+        const data = await res.json();
+        if (!data.values || !data.values.length) {
+            canvas.replaceWith(Object.assign(document.createElement('p'), {
+                className: 'text-muted mt-5',
+                textContent: 'No data yet.'
+            }));
+            return;
+        }
+        const draw = canvas.dataset.kind === 'line' ? drawLineChart : drawBarChart;
+        draw(canvas, data, canvas.dataset.color);
+    } catch (err) {
+        console.error('Failed to render chart:', err);
+    }
+}
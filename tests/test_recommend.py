@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import recommend, storage
+
+
+@pytest.fixture(params=['scipy', 'numpy'])
+def branch(request, monkeypatch):
+    if request.param == 'scipy':
+        pytest.importorskip('scipy')
+    else:
+        monkeypatch.setattr(recommend, 'sparse', None)
+    return request.param
+
+
+def _log(n_rows, n_members=40, n_books=60, seed=7):
+    rng = np.random.default_rng(seed)
+    rows = [
+        [f'T{i:05d}', f'B{b:03d}', f'M{m:03d}', '2024-01-01', action]
+        for i, (b, m, action) in enumerate(zip(
+            rng.integers(n_books, size=n_rows), rng.integers(n_members, size=n_rows),
+            rng.choice(['Issue', 'Return'], size=n_rows, p=[0.7, 0.3]),
+        ))
+    ]
+    df = pd.DataFrame(rows, columns=storage.TRANSACTION_COLUMNS)
+    return storage.apply_schema('transactions', df)
+
+
+def _expected(log, k):
+    """Top-k co-borrowed books per book by brute force (ties in catalogue order)."""
+    issues = log[log['Action'] == 'Issue']
+    pairs = set(zip(issues['MemberID'].astype(object), issues['BookID'].astype(object)))
+    borrowers = {}
+    for member, book in pairs:
+        borrowers.setdefault(book, set()).add(member)
+    catalogue = log['BookID'].cat.categories.tolist()
+    top = {}
+    for book in catalogue:
+        counts = [
+            (len(borrowers.get(book, set()) & borrowers.get(other, set())), other)
+            for other in catalogue if other != book
+        ]
+        top[book] = [(other, n) for n, other in sorted(counts, key=lambda c: (-c[0], catalogue.index(c[1]))) if n][:k]
+    return top
+
+
+def test_build_matches_brute_force(branch, monkeypatch):
+    log = _log(600)
+    monkeypatch.setattr(recommend.cache, 'peek_table', lambda table: (log, 1, None))
+    monkeypatch.setattr(recommend, 'BLOCK_PAIRS', 50)  # several blocks
+
+    model = recommend._build()
+
+    ids = model['book_ids']
+    for book, expected in _expected(log, recommend.TOP_K).items():
+        code = model['book_code'][book]
+        got = [
+            (ids[other], int(n))
+            for other, n in zip(model['neighbors'][code], model['counts'][code]) if other >= 0
+        ]
+        assert got == expected, book
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from utils import snapshot, storage
+
+
+@pytest.fixture(params=['feather', 'pickle'])
+def fmt(request, monkeypatch):
+    if request.param == 'feather':
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(snapshot, 'FORMAT', request.param)
+    return request.param
+
+
+def _write_books(path, rows):
+    pd.DataFrame(rows, columns=storage.BOOK_COLUMNS).to_csv(path, index=False)
+
+
+def test_snapshot_covers_appended_rows(tmp_path, fmt):
+    backend = storage.CsvStorage(tmp_path, snapshots=True)
+    path = backend.path('books')
+    _write_books(path, [['B001', 'A', 'X', 'CS', 'Available']])
+    backend.read('books')  # parses the CSV and saves a snapshot
+    assert snapshot.snapshot_path(path).suffix == ('.feather' if fmt == 'feather' else '.pkl')
+
+    with open(path, 'a') as f:
+        f.write('B002,B,Y,CS,Issued\n')
+    df, offset = snapshot.load(path)
+    assert df['BookID'].tolist() == ['B001'] and offset < path.stat().st_size
+    assert backend.read('books')['BookID'].tolist() == ['B001', 'B002']
+
+
+def test_metadata_never_describes_another_writers_snapshot(tmp_path, fmt, monkeypatch):
+    path = tmp_path / 'books.csv'
+    _write_books(path, [['B001', 'A', 'X', 'CS', 'Available']])
+    state = snapshot.file_state(path)
+    theirs = storage.apply_schema('books', pd.read_csv(path, dtype=str))
+    ours = theirs.iloc[:0]
+
+    # Another worker replaces the snapshot file between our data and metadata writes
+    digest = snapshot._digest
+
+    def interleaved(*args):
+        monkeypatch.setattr(snapshot, '_digest', digest)
+        snapshot._write_atomic(snapshot.snapshot_path(path), lambda tmp: snapshot._dump(theirs, tmp))
+        return digest(*args)
+
+    monkeypatch.setattr(snapshot, '_digest', interleaved)
+    snapshot.save(path, ours, state)
+
+    assert snapshot.load(path) is None
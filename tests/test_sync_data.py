@@ -0,0 +1,47 @@
+import pandas as pd
+
+from utils import storage, sync_data
+
+
+def _books(rows):
+    df = pd.DataFrame(rows, columns=storage.BOOK_COLUMNS)
+    return storage.apply_schema('books', df)
+
+
+def _log(rows):
+    df = pd.DataFrame(rows, columns=storage.TRANSACTION_COLUMNS)
+    return storage.apply_schema('transactions', df)
+
+
+def test_plan_repair_with_only_issues_in_the_log():
+    # A categorical Action with the single category 'Issue'
+    books = _books([
+        ['B001', 'A', 'X', 'CS', 'Available'],
+        ['B002', 'B', 'Y', 'CS', 'Available'],
+    ])
+    log = _log([['T001', 'B001', 'M001', '2024-01-01', 'Issue']])
+
+    _, diff = sync_data.plan_repair(books, sync_data.last_actions(log))
+
+    assert diff[['BookID', 'Old', 'New']].values.tolist() == [['B001', 'Available', 'Issued']]
+
+
+def test_chunked_last_actions_match_in_memory_on_numeric_ids(tmp_path):
+    rows = [
+        ['T001', '1001', 'M001', '2024-01-01', 'Issue'],
+        ['T002', '1002', 'M002', '2024-01-02', 'Issue'],
+        ['T003', '1002', 'M002', '2024-01-05', 'Return'],
+    ]
+    path = tmp_path / 'transactions.csv'
+    pd.DataFrame(rows, columns=storage.TRANSACTION_COLUMNS).to_csv(path, index=False)
+    books = _books([
+        ['1001', 'A', 'X', 'CS', 'Issued'],
+        ['1002', 'B', 'Y', 'CS', 'Available'],
+    ])
+
+    chunked = sync_data.last_actions_chunked(path, chunksize=1)
+    in_memory = sync_data.last_actions(_log(rows))
+
+    assert chunked.to_dict() == in_memory.astype(object).to_dict() == {'1001': 'Issue', '1002': 'Return'}
+    _, diff = sync_data.plan_repair(books, chunked)
+    assert diff.empty
@@ -0,0 +1,197 @@
+import threading
+from collections import Counter
+
+import pandas as pd
+
+from utils import cache, metrics, store
+from utils.storage import DATE_FORMAT
+
+# Library-wide counters behind the dashboard and /api/analytics/*.
+# Each table has a section of counters tied to the table version it
+# describes. Writes made in this process are folded in as they commit
+# (cache.subscribe), so keeping the counters current costs O(1) per issue,
+# return, add or delete; a section is only recounted from the table when
+# its version moved some other way (another worker, a manual edit).
+#
+# Single-column counters per table; the transaction log also keeps daily
+# counts and circulation counters (see _row_keys).
+COLUMN_COUNTERS = {
+    'books': {'by_status': 'Status', 'by_department': 'Department'},
+    'members': {'by_role': 'Role', 'by_department': 'Department'},
+    'transactions': {'by_action': 'Action'},
+}
+
+_lock = threading.Lock()
+_sections = {}
+
+
+def _day(value):
+    return None if pd.isna(value) else pd.Timestamp(value).strftime(DATE_FORMAT)
+
+
+def _counts(values):
+    counts = values.value_counts()
+    return Counter({key: int(n) for key, n in counts.items() if n > 0})
+
+
+def _row_keys(table, row):
+    """Yields (counter, key) for every counter one row adds to."""
+    for name, column in COLUMN_COUNTERS[table].items():
+        yield name, row[column]
+    if table == 'transactions':
+        yield 'daily', _day(row['Date'])
+        # Circulation: how often each book was issued / each member borrowed
+        if row['Action'] == 'Issue':
+            yield 'book_issues', row['BookID']
+            yield 'member_issues', row['MemberID']
+
+
+@metrics.timed('aggregates.rebuild')
+def _build(table):
+    """Recounts one table's section from the cached frame (vectorized)."""
+    df, _, version = cache.peek_table(table)
+    section = {'version': version, 'rows': len(df)}
+    for name, column in COLUMN_COUNTERS[table].items():
+        section[name] = _counts(df[column])
+    if table == 'transactions':
+        issues = df[df['Action'] == 'Issue']
+        section['daily'] = Counter({_day(day): n for day, n in _counts(df['Date']).items()})
+        section['book_issues'] = _counts(issues['BookID'])
+        section['member_issues'] = _counts(issues['MemberID'])
+    return section
+
+
+def _add_row(section, table, row, sign):
+    section['rows'] += sign
+    for name, key in _row_keys(table, row):
+        if pd.isna(key):
+            continue
+        counter = section[name]
+        counter[key] += sign
+        if counter[key] <= 0:
+            del counter[key]
+
+
+def _on_commit(events, versions):
+    with _lock:
+        live = {}
+        for table, (before, after) in versions.items():
+            section = _sections.get(table)
+            if section is not None and section['version'] == before:
+                live[table] = section
+            else:
+                _sections.pop(table, None)
+        for event in events:
+            kind, table = event[0], event[1]
+            section = live.get(table)
+            if section is None:
+                continue
+            if kind == 'append':
+                for row in event[2]:
+                    _add_row(section, table, row, 1)
+            elif kind == 'update':
+                _add_row(section, table, event[2], -1)
+                _add_row(section, table, {**event[2], **event[3]}, 1)
+            elif kind == 'delete':
+                _add_row(section, table, event[2], -1)
+            else:
+                del live[table]
+                _sections.pop(table, None)
+        for table, section in live.items():
+            section['version'] = versions[table][1]
+
+
+cache.subscribe(_on_commit)
+
+
+def _section(table):
+    """Returns the current counters of `table`, recounting them if stale."""
+    version = cache.table_version(table)
+    with _lock:
+        section = _sections.get(table)
+        if section is not None and section['version'] == version:
+            return section
+    section = _build(table)
+    with _lock:
+        _sections[table] = section
+    return section
+
+
+def _series(counter):
+    """Counter -> Series, largest first (ties in first-seen order)."""
+    with _lock:
+        items = counter.most_common()
+    return pd.Series(dict(items), dtype='int64')
+
+
+def count(table):
+    """Number of rows in `table`."""
+    return _section(table)['rows']
+
+
+def kpis():
+    """The dashboard KPIs, without scanning any table."""
+    books = _section('books')
+    with _lock:
+        issued = books['by_status'].get('Issued', 0)
+    return {
+        'total_books': books['rows'],
+        'issued_books': issued,
+        'available_books': books['rows'] - issued,
+        'total_members': count('members'),
+    }
+
+
+def books_by_department():
+    """Number of books per department, largest first"""
+    return _series(_section('books')['by_department'])
+
+
+def books_by_status():
+    """Number of books per status"""
+    return _series(_section('books')['by_status'])
+
+
+def members_by_role():
+    """Number of members per role, largest first"""
+    return _series(_section('members')['by_role'])
+
+
+def daily_transactions():
+    """Number of transactions per day, in date order"""
+    section = _section('transactions')
+    with _lock:
+        daily = dict(section['daily'])
+    series = pd.Series(daily, dtype='int64').sort_index()
+    series.index = pd.to_datetime(series.index, format=DATE_FORMAT)
+    return series
+
+
+def most_issued_books(limit=10):
+    """[(BookID, issues)] for the most issued books, largest first"""
+    section = _section('transactions')
+    with _lock:
+        return section['book_issues'].most_common(limit)
+
+
+def top_borrowed_books(limit=10):
+    """Most issued books, labelled with their titles"""
+    top = most_issued_books(limit)
+    ids = [book_id for book_id, _ in top]
+    titles = store.take('books', 'BookID', ids, ['Title'])['Title']
+    labels = [title if isinstance(title, str) else book_id for book_id, title in zip(ids, titles)]
+    return pd.Series([n for _, n in top], index=labels, dtype='int64')
+
+
+def book_circulation(book_id):
+    """How many times a book has been issued."""
+    section = _section('transactions')
+    with _lock:
+        return section['book_issues'].get(book_id, 0)
+
+
+def member_circulation(member_id):
+    """How many books a member has borrowed in total."""
+    section = _section('transactions')
+    with _lock:
+        return section['member_issues'].get(member_id, 0)
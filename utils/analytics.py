@@ -1,68 +1,147 @@
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from concurrent.futures import ThreadPoolExecutor
 import io
-import base64
+import hashlib
+import threading
 
-def calculate_kpis(books, members, transactions):
-    """Calculates simple KPIs for the dashboard"""
-    total_books = len(books)
-    issued_books = len(books[books['Status'] == 'Issued'])
-    available_books = total_books - issued_books
-    total_members = len(members)
-    
-    return {
-        'total_books': total_books,
-        'issued_books': issued_books,
-        'available_books': available_books,
-        'total_members': total_members
-    }
+from utils import aggregates, cache, metrics
+from utils.data_manager import BOOKS, MEMBERS, TRANSACTIONS
 
-def get_plot_url(plot_func, *args):
-    """Helper to convert a Matplotlib plot to a base64 string for HTML"""
+# Charts are drawn on standalone Figure objects with their own Agg canvas.
+# Nothing goes through pyplot's global state, so charts can be rendered from
+# several threads at once (threaded WSGI workers, or the chart pool below).
+def new_figure():
+    """Creates a 6x4in Figure attached to its own Agg canvas"""
+    fig = Figure(figsize=(6, 4))
+    FigureCanvasAgg(fig)
+    return fig
+
+@metrics.timed('analytics.render_png')
+def render_png(plot_func, *args):
+    """Helper to render a Matplotlib plot to PNG bytes"""
     img = io.BytesIO()
-    plot_func(*args)
-    plt.savefig(img, format='png', bbox_inches='tight')
-    img.seek(0)
-    plot_url = base64.b64encode(img.getvalue()).decode()
-    plt.close() # Close figure to free memory
-    return 'data:image/png;base64,{}'.format(plot_url)
+    fig = plot_func(*args)
+    fig.savefig(img, format='png', bbox_inches='tight')
+    return img.getvalue()
+
+def plot_department_counts(counts):
+    fig = new_figure()
+    ax = fig.add_subplot()
+    labels = [str(label) for label in counts.index]
+    ax.bar(labels, counts.values, color='#6366f1') # Brand color
+    ax.set_title('Library Collection by Department')
+    ax.set_xlabel('Department')
+    ax.set_ylabel('Count')
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    return fig
+
+def plot_daily_counts(daily_counts):
+    fig = new_figure()
+    ax = fig.add_subplot()
+    ax.plot(daily_counts.index, daily_counts.values, marker='o', color='green')
+    ax.set_title('Transactions Over Time')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Transactions')
+    ax.grid(True)
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    return fig
+
+# --- Cached dashboard charts ---
+# Each chart is rendered once per version of the table it plots and kept as
+# PNG bytes. Every write in data_manager bumps the table version, so a chart
+# is re-rendered only after the data behind it changed. Charts plot the
+# precomputed counters in utils/aggregates.py rather than the raw tables.
+CHARTS = {
+    'category_bar': (plot_department_counts, aggregates.books_by_department, BOOKS),
+    'transaction_line': (plot_daily_counts, aggregates.daily_transactions, TRANSACTIONS),
+}
+
+# One lock per chart: concurrent requests never render the same chart twice,
+# while different charts can render in parallel
+_chart_locks = {name: threading.Lock() for name in CHARTS}
+_chart_cache = {}
+_chart_pools = {}
+_chart_pools_lock = threading.Lock()
+
+@metrics.timed('analytics.get_chart')
+def get_chart(name):
+    """
+    Returns the cached chart as a dict with 'png', 'etag' and
+    'last_modified', rendering it first if its data changed.
+    Returns None when there is nothing to plot.
+    """
+    plot_func, counts, table = CHARTS[name]
+    with _chart_locks[name]:
+        version = cache.table_version(table)
+        entry = _chart_cache.get(name)
+        if entry is None or entry['version'] != version:
+            series = counts()
+            png = render_png(plot_func, series) if not series.empty else None
+            entry = {
+                'version': version,
+                'png': png,
+                # Content hash, so every worker hands out the same ETag
+                'etag': hashlib.sha1(png).hexdigest() if png else None,
+                'last_modified': cache.last_modified(table),
+            }
+            _chart_cache[name] = entry
+    return entry if entry['png'] is not None else None
+
+def _chart_pool(workers):
+    with _chart_pools_lock:
+        if workers not in _chart_pools:
+            _chart_pools[workers] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='chart'
+            )
+        return _chart_pools[workers]
+
+@metrics.timed('analytics.get_charts')
+def get_charts(names, workers=0):
+    """
+    Returns {name: get_chart(name)} for several charts. With workers > 0
+    the charts that need re-rendering are drawn concurrently on a shared
+    thread pool, so a dashboard waits for its slowest chart rather than
+    the sum of all of them.
+    """
+    if workers and len(names) > 1:
+        pool = _chart_pool(workers)
+        return dict(zip(names, pool.map(get_chart, names)))
+    return {name: get_chart(name) for name in names}
 
-def plot_books_by_department(books):
-    counts = books['Department'].value_counts()
-    plt.figure(figsize=(6, 4))
-    counts.plot(kind='bar', color='#6366f1') # Brand color
-    plt.title('Library Collection by Department')
-    plt.xlabel('Department')
-    plt.ylabel('Count')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+# --- JSON chart data (/api/analytics/*) ---
+# Compact {labels, values} payloads for client-side rendering, read from
+# the aggregates store and memoized per version of the tables behind them.
+ANALYTICS = {
+    'books-by-department': (aggregates.books_by_department, (BOOKS,)),
+    'books-by-status': (aggregates.books_by_status, (BOOKS,)),
+    'members-by-role': (aggregates.members_by_role, (MEMBERS,)),
+    'transactions-timeline': (aggregates.daily_transactions, (TRANSACTIONS,)),
+    'top-books': (aggregates.top_borrowed_books, (TRANSACTIONS, BOOKS)),
+}
 
-def plot_transactions_timeline(transactions):
-    # Ensure date is datetime
-    transactions['Date'] = pd.to_datetime(transactions['Date'])
-    daily_counts = transactions.groupby('Date').size()
-    
-    plt.figure(figsize=(6, 4))
-    daily_counts.plot(kind='line', marker='o', color='green')
-    plt.title('Transactions Over Time')
-    plt.xlabel('Date')
-    plt.ylabel('Transactions')
-    plt.grid(True)
-    plt.tight_layout()
+_analytics_lock = threading.Lock()
+_analytics_cache = {}
 
-def generate_charts(books, transactions):
-    """Generates all charts and returns a dict of base64 strings"""
-    charts = {}
-    
-    # 1. Books by Department
-    charts['category_bar'] = get_plot_url(plot_books_by_department, books)
-    
-    # 2. Transaction Timeline (only if check if not empty to avoid errors)
-    if not transactions.empty:
-        charts['transaction_line'] = get_plot_url(plot_transactions_timeline, transactions)
+def series_to_json(series):
+    """Converts an aggregate Series to {'labels': [...], 'values': [...]}"""
+    if isinstance(series.index, pd.DatetimeIndex):
+        labels = series.index.strftime('%Y-%m-%d').tolist()
     else:
-        charts['transaction_line'] = None # Handle empty case in template
+        labels = [str(label) for label in series.index]
+    return {'labels': labels, 'values': [int(v) for v in series.tolist()]}
 
-    return charts
+@metrics.timed('analytics.get_analytics')
+def get_analytics(name):
+    """Returns the JSON-ready data for one entry of ANALYTICS."""
+    func, tables = ANALYTICS[name]
+    with _analytics_lock:
+        key = tuple(cache.table_version(table) for table in tables)
+        entry = _analytics_cache.get(name)
+        if entry is None or entry['key'] != key:
+            entry = {'key': key, 'data': series_to_json(func())}
+            _analytics_cache[name] = entry
+        return entry['data']
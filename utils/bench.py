@@ -0,0 +1,261 @@
+"""
+Benchmarks the data layer and the web routes on a synthetic dataset.
+
+    python -m utils.bench --rows 100000 --out bench.json
+    python -m utils.bench --rows 100000 --out new.json --compare bench.json
+
+Generates a seeded dataset (utils/synthetic.py) in a scratch directory, or
+copies the CSV files of --data-dir there, so the benchmark never writes to
+real data. It then times the data-layer entry points and a request to every
+route through the Flask test client, and writes a JSON report. With
+--compare, each median is printed against an earlier report and the exit
+status is 1 when any of them got slower by more than --threshold.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils import cache, storage, synthetic
+
+# Timings below this many milliseconds are too noisy to flag as regressions
+NOISE_FLOOR_MS = 2.0
+
+
+def _timed(func, repeat):
+    """Runs `func` `repeat` times; returns its timings in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        'runs': repeat,
+        'first_ms': round(times[0], 3),
+        'min_ms': round(min(times), 3),
+        'median_ms': round(statistics.median(times), 3),
+        'max_ms': round(max(times), 3),
+    }
+
+
+def _quiet(func, *args, **kwargs):
+    """Calls a function that reports with print(), discarding its output."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def _use_data(data_dir, kind):
+    """Points the process-wide backend at the benchmark dataset."""
+    if kind == 'sqlite':
+        db_file = Path(data_dir) / 'library.db'
+        storage.import_csv(data_dir, db_file)
+        storage.set_backend(storage.SqliteStorage(db_file))
+    else:
+        storage.set_backend(storage.CsvStorage(data_dir))
+    cache.invalidate()
+
+
+def bench_data_layer(data_dir, repeat, rng, skip):
+    from utils import analytics, data_manager as dm, reports, sync_data
+
+    results = {}
+
+    def run(name, func, runs=repeat):
+        if any(name.startswith(prefix) for prefix in skip):
+            return
+        print(f"-> {name}", file=sys.stderr)
+        results[name] = _timed(func, runs)
+
+    def cold_load():
+        cache.invalidate()
+        dm.load_data()
+
+    # The first read parses the CSV files (and writes snapshots); later cold
+    # reads load the snapshots, or the SQLite tables
+    run('load_data (first read)', cold_load, runs=1)
+    run('load_data (cold)', cold_load)
+    run('load_data (cached)', dm.load_data)
+
+    books, members, transactions = dm.load_data()
+    words = [word.lower() for word in synthetic.SUBJECTS]
+    queries = iter(words * (repeat // len(words) + 2))
+    run('search_books (index build)', lambda: dm.search_books(next(queries)), runs=1)
+    run('search_books', lambda: dm.search_books(next(queries)))
+    run('page_books (search)', lambda: dm.page_books(next(queries)))
+    run('page_books (status filter)', lambda: dm.page_books(status='Issued', page=3))
+    run('suggest_books', lambda: dm.suggest_books(next(queries)[:3], status='Available'))
+
+    loans = dm.active_loans_frame()
+    busiest = loans['MemberID'].value_counts().index[0] if len(loans) else members['MemberID'].iloc[0]
+    run('get_member_current_loans', lambda: dm.get_member_current_loans(busiest))
+    run('get_member_history', lambda: dm.get_member_history(busiest))
+    run('query_transactions (limit 10)', lambda: dm.query_transactions(limit=10))
+    run('get_transaction_history', dm.get_transaction_history, runs=min(repeat, 3))
+
+    run('render_charts', lambda: [
+        analytics.render_png(plot, counts()) for plot, counts, _ in analytics.CHARTS.values()
+    ], runs=min(repeat, 3))
+    run('get_charts', lambda: analytics.get_charts(list(analytics.CHARTS)))
+    run('reports.active_loans', reports.active_loans)
+    run('reports.loan_durations', lambda: reports.loan_durations('Department'))
+    run('repair_data (dry run)', lambda: _quiet(sync_data.repair_data, dry_run=True),
+        runs=min(repeat, 3))
+
+    # Writes: each run issues (then returns) a different available book
+    available = books.loc[books['Status'] == 'Available', 'BookID'].to_numpy()
+    picked = rng.choice(available, size=min(repeat, len(available)), replace=False).tolist()
+    member = members['MemberID'].iloc[0]
+    to_issue, to_return = iter(picked), iter(picked)
+    if picked:
+        run('issue_book', lambda: dm.issue_book(next(to_issue), member), runs=len(picked))
+        run('return_book', lambda: dm.return_book(next(to_return)), runs=len(picked))
+    return results
+
+
+def routes():
+    """The GET routes to time, with sample IDs from the dataset filled in."""
+    from utils import analytics, data_manager as dm, reports
+
+    books, members = dm.load_books(), dm.load_members()
+    book, member = books['BookID'].iloc[0], members['MemberID'].iloc[len(members) // 2]
+    urls = [
+        '/', '/books', '/books?q=machine', '/books?status=Issued&page=5',
+        '/members', '/members?role=Faculty', f'/member/{member}',
+        '/issue', '/return', '/import', '/reports',
+        f'/api/book/{book}', f'/api/member/{member}',
+        '/api/suggest/books?q=adv&status=Available', '/api/suggest/members?q=pri',
+        '/api/transactions?limit=50',
+        '/export/books.csv', '/export/transactions.ndjson?action=Return',
+    ]
+    urls += [f'/api/analytics/{name}' for name in analytics.ANALYTICS]
+    urls += [f'/charts/{name}.png' for name in analytics.CHARTS]
+    urls += [f'/reports/{name}.csv' for name in reports.REPORTS]
+    return urls
+
+
+def bench_routes(repeat, skip):
+    from app import app
+
+    client = app.test_client()
+    results = {}
+    for url in routes():
+        name = f'GET {url}'
+        if any(name.startswith(prefix) for prefix in skip):
+            continue
+        print(f"-> {name}", file=sys.stderr)
+        statuses = set()
+
+        def request():
+            response = client.get(url)
+            response.get_data()
+            statuses.add(response.status_code)
+
+        results[name] = _timed(request, repeat)
+        results[name]['status'] = sorted(statuses)
+        if max(statuses) >= 500:
+            print(f"   server error {sorted(statuses)}", file=sys.stderr)
+    return results
+
+
+def compare(report, baseline, threshold):
+    """Prints each timing against `baseline`; returns the names that regressed."""
+    regressed = []
+    old_results = baseline.get('results', {})
+    for key in ('storage', 'tables', 'repeat'):
+        before, after = baseline.get('meta', {}).get(key), report['meta'][key]
+        if before != after:
+            print(f"-> note: {key} differs ({before} before, {after} now)", file=sys.stderr)
+    print(f"{'benchmark':<52} {'before':>10} {'after':>10} {'ratio':>7}")
+    for name, result in report['results'].items():
+        old = old_results.get(name)
+        if old is None:
+            print(f"{name:<52} {'-':>10} {result['median_ms']:>10.2f}")
+            continue
+        ratio = result['median_ms'] / max(old['median_ms'], 1e-6)
+        flag = ''
+        if ratio > threshold and result['median_ms'] > NOISE_FLOOR_MS:
+            flag = '  REGRESSION'
+            regressed.append(name)
+        print(f"{name:<52} {old['median_ms']:>10.2f} {result['median_ms']:>10.2f} {ratio:>6.2f}x{flag}")
+    return regressed
+
+
+def run_benchmarks(rows, seed=0, repeat=5, kind='csv', data_dir=None, skip=()):
+    """Builds the dataset, runs every benchmark and returns the report."""
+    work_dir = Path(tempfile.mkdtemp(prefix='library-bench-'))
+    try:
+        if data_dir:
+            for table in storage.TABLES:
+                shutil.copy(Path(data_dir) / f'{table}.csv', work_dir)
+        else:
+            print(f"-> generating {rows} transactions (seed {seed})", file=sys.stderr)
+            synthetic.generate(work_dir, rows, seed=seed)
+        counts = {table: len(pd.read_csv(work_dir / f'{table}.csv', usecols=[0])) for table in storage.TABLES}
+
+        _use_data(work_dir, kind)
+        rng = np.random.default_rng(seed)
+        results = bench_data_layer(work_dir, repeat, rng, skip)
+        results.update(bench_routes(repeat, skip))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'rows': rows if not data_dir else None,
+            'data_dir': str(data_dir) if data_dir else None,
+            'seed': seed,
+            'storage': kind,
+            'repeat': repeat,
+            'tables': counts,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the library app on a synthetic dataset.")
+    parser.add_argument('--rows', type=int, default=100000, help="transactions to generate (about)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help="runs per benchmark")
+    parser.add_argument('--storage', choices=['csv', 'sqlite'], default='csv')
+    parser.add_argument('--data-dir', default=None, help="benchmark a copy of these CSV files instead")
+    parser.add_argument('--skip', default='', help="comma-separated name prefixes of benchmarks to skip")
+    parser.add_argument('--out', default='bench.json', help="where to write the JSON report")
+    parser.add_argument('--compare', default=None, help="earlier report to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="slowdown ratio reported as a regression (default 1.25)")
+    args = parser.parse_args(argv)
+
+    skip = tuple(prefix.strip() for prefix in args.skip.split(',') if prefix.strip())
+    report = run_benchmarks(args.rows, args.seed, args.repeat, args.storage, args.data_dir, skip)
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"-> report written to {args.out}", file=sys.stderr)
+
+    if args.compare:
+        regressed = compare(report, json.loads(Path(args.compare).read_text()), args.threshold)
+        if regressed:
+            print(f"-> {len(regressed)} benchmark(s) slower than {args.threshold}x", file=sys.stderr)
+            sys.exit(1)
+    else:
+        for name, result in report['results'].items():
+            print(f"{name:<52} {result['median_ms']:>10.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+import threading
+from datetime import datetime, timezone
+from itertools import count
+
+import pandas as pd
+
+from utils import metrics, storage
+
+# Shared in-process cache of the library tables, keyed by table name, with
+# write-through to the storage backend (see utils/storage.py).
+# Each entry remembers the backend signature of the data it was read from
+# (file mtime/size for CSV, a per-table change counter for SQLite), so a
+# table is only re-read when it actually changed.
+#
+# Every entry also carries two counters:
+#   version    - changes on any change to the table
+#   generation - changes only when existing rows may have moved or changed
+#                their keys; appends and in-place cell updates keep it, so
+#                indexes built on the table can be extended instead of rebuilt
+_lock = threading.RLock()
+_tables = {}
+_versions = count(1)
+
+# Callbacks told about every committed write (see subscribe)
+_listeners = []
+
+
+def _new_entry(table, df, generation=None):
+    version = next(_versions)
+    return {
+        'table': table,
+        'signature': storage.get_backend().signature(table),
+        'df': df,
+        'pending': [],
+        'version': version,
+        'generation': generation or version,
+    }
+
+
+def _fresh_entry(table):
+    """Returns the cache entry for `table`, re-reading it if it changed."""
+    backend = storage.get_backend()
+    entry = _tables.get(table)
+    if entry is None or entry['signature'] != backend.signature(table):
+        metrics.inc('library_table_reads_total', table=table)
+        with metrics.timer('cache.read_table'):
+            df = backend.read(table)
+        entry = _new_entry(table, df)
+        _tables[table] = entry
+    return entry
+
+
+def _materialize(entry):
+    """Folds rows recorded by appends into the cached DataFrame."""
+    if entry['pending']:
+        entry['df'] = storage.concat_rows(entry['table'], entry['df'], entry['pending'])
+        entry['pending'] = []
+    return entry['df']
+
+
+def get_table(table):
+    """Returns a private copy of `table`."""
+    with _lock:
+        return _materialize(_fresh_entry(table)).copy()
+
+
+def peek_table(table):
+    """
+    Returns (df, generation, version) for `table`.
+    The DataFrame is the shared cached object and must not be modified.
+    """
+    with _lock:
+        entry = _fresh_entry(table)
+        return _materialize(entry), entry['generation'], entry['version']
+
+
+def table_shape(table):
+    """Returns (generation, row count) for the table without copying it."""
+    with _lock:
+        entry = _fresh_entry(table)
+        return entry['generation'], len(entry['df']) + len(entry['pending'])
+
+
+def read_tail(table, start):
+    """
+    Returns (generation, row count, rows) where rows are the records from
+    position `start` onwards as dicts. Buffered appends are read directly
+    (typed like the table), so following a growing log never concatenates
+    the full table.
+    """
+    with _lock:
+        entry = _fresh_entry(table)
+        df, pending = entry['df'], entry['pending']
+        rows = df.iloc[start:].to_dict('records') if start < len(df) else []
+        tail = pending[max(0, start - len(df)):]
+        if tail:
+            tail = pd.DataFrame(tail, columns=df.columns)
+            rows.extend(storage.apply_schema(table, tail).to_dict('records'))
+        return entry['generation'], len(df) + len(pending), rows
+
+
+def table_length(table):
+    """Returns the number of rows in the table without copying it."""
+    return table_shape(table)[1]
+
+
+def table_version(table):
+    """Returns a number that changes whenever `table` changes."""
+    with _lock:
+        return _fresh_entry(table)['version']
+
+
+def last_modified(table):
+    """Returns when the backend last stored a change to `table` (UTC)."""
+    timestamp = storage.get_backend().last_modified(table)
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def commit(ops):
+    """
+    Applies write operations through the storage backend and mirrors them
+    in the cache, so the next read does not have to reload the table.
+
+    Operations (positions are row positions in the cached table):
+        ('append',  table, rows)
+        ('update',  table, position, changes, expected)
+        ('delete',  table, position)
+        ('replace', table, df, rows_stable)
+    `expected` maps columns to the values the row must still hold; if it
+    does not, storage.ConflictError is raised and nothing is written.
+    Pass rows_stable=True when every existing row kept its position and key,
+    so indexes built on the table stay reusable.
+    """
+    backend = storage.get_backend()
+    with storage.write_lock(), _lock:
+        frames = {}     # table -> rewritten DataFrame (backends without row writes)
+        stable = {}     # table -> whether the rewrite kept rows in place
+        deleted = {}    # table -> keys of deleted rows
+        replaced = set()
+        generations = {}
+        versions = {}
+        events = []
+        backend_ops = []
+        for op in ops:
+            kind, table = op[0], op[1]
+            df = frames.get(table)
+            if df is None:
+                entry = _fresh_entry(table)
+                generations.setdefault(table, entry['generation'])
+                versions.setdefault(table, entry['version'])
+                df = _materialize(entry)
+            key_column = storage.TABLE_KEYS[table]
+
+            if kind == 'append':
+                events.append(('append', table, op[2]))
+                if table in frames:
+                    frames[table] = storage.concat_rows(table, df, op[2])
+                else:
+                    backend_ops.append(op)
+            elif kind == 'update':
+                _, _, position, changes, expected = op
+                for col, value in expected.items():
+                    if df.iat[position, df.columns.get_loc(col)] != value:
+                        raise storage.ConflictError(f"{table} row changed concurrently.")
+                events.append(('update', table, df.iloc[position].to_dict(), changes))
+                if backend.row_writes:
+                    key = df.iat[position, df.columns.get_loc(key_column)]
+                    backend_ops.append(('update', table, key, changes, expected))
+                else:
+                    df = df.copy() if table not in frames else df
+                    for col, value in changes.items():
+                        storage.set_value(df, position, col, value)
+                    frames[table] = df
+                    stable.setdefault(table, True)
+            elif kind == 'delete':
+                position = op[2]
+                key = df.iat[position, df.columns.get_loc(key_column)]
+                deleted.setdefault(table, []).append(key)
+                events.append(('delete', table, df.iloc[position].to_dict()))
+                if backend.row_writes:
+                    backend_ops.append(('delete', table, key))
+                else:
+                    frames[table] = df.drop(index=df.index[position]).reset_index(drop=True)
+                    stable[table] = False
+            elif kind == 'replace':
+                events.append(('replace', table))
+                replaced.add(table)
+                frames[table] = storage.apply_schema(table, op[2].reset_index(drop=True))
+                stable[table] = bool(op[3]) and stable.get(table, True)
+            else:
+                raise ValueError(f"Unknown write operation {kind!r}")
+
+        backend_ops += [('replace', table, df) for table, df in frames.items()]
+        with metrics.timer('cache.commit'):
+            backend.apply(backend_ops)
+        for op in ops:
+            rows = len(op[2]) if op[0] in ('append', 'replace') else 1
+            metrics.inc('library_rows_written_total', rows, table=op[1], op=op[0])
+
+        # Mirror the writes in the cached entries
+        for op in ops:
+            kind, table = op[0], op[1]
+            if table in frames:
+                continue
+            entry = _tables[table]
+            if kind == 'append':
+                entry['pending'].extend(op[2])
+            elif kind == 'update':
+                df = _materialize(entry)
+                for col, value in op[3].items():
+                    storage.set_value(df, op[2], col, value)
+            elif kind == 'delete':
+                df = _materialize(entry)
+                entry['df'] = df.drop(index=df.index[op[2]]).reset_index(drop=True)
+                entry['generation'] = next(_versions)
+            entry['signature'] = backend.signature(table)
+            entry['version'] = next(_versions)
+        for table, df in frames.items():
+            previous = _tables.get(table)
+            generation = previous['generation'] if stable[table] and previous else None
+            _tables[table] = _new_entry(table, df.copy(), generation)
+        # Remember which keys a delete removed, so structures keyed by record
+        # (rather than row position) can drop them instead of rebuilding
+        for table, keys in deleted.items():
+            if table not in replaced:
+                _tables[table]['parent'] = {'generation': generations[table], 'deleted': keys}
+
+        versions = {table: (before, _tables[table]['version']) for table, before in versions.items()}
+        for listener in _listeners:
+            listener(events, versions)
+
+
+def subscribe(listener):
+    """
+    Registers `listener(events, versions)` to be called after every commit
+    in this process, while the write lock is still held. `events` describe
+    the committed operations in order:
+        ('append',  table, rows)
+        ('update',  table, old_row, changes)
+        ('delete',  table, old_row)
+        ('replace', table)
+    and `versions` maps each written table to (version before, version
+    after). A listener whose state was not built from the "before" version
+    must not apply the events (the table also changed some other way).
+    Listeners must not call back into the cache.
+    """
+    _listeners.append(listener)
+
+
+def deleted_since(table, generation):
+    """
+    Returns the keys removed from `table` by the delete that ended
+    `generation`, or None if the table changed in any other way since.
+    """
+    with _lock:
+        entry = _fresh_entry(table)
+        parent = entry.get('parent')
+        if parent is None or parent['generation'] != generation:
+            return None
+        return list(parent['deleted'])
+
+
+def append_rows(table, rows):
+    """Appends rows to the table without rewriting it."""
+    commit([('append', table, rows)])
+
+
+def invalidate(table=None):
+    """Drops one cached table, or all of them when no table is given."""
+    with _lock:
+        if table is None:
+            _tables.clear()
+        else:
+            _tables.pop(table, None)
@@ -1,146 +1,529 @@
 import pandas as pd
+import numpy as np
+import functools
+import hashlib
 import os
+import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from pathlib import Path
 
-BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = BASE_DIR / 'data'
-BOOKS_FILE = DATA_DIR / 'books.csv'
-MEMBERS_FILE = DATA_DIR / 'members.csv'
-TRANSACTIONS_FILE = DATA_DIR / 'transactions.csv'
+from utils import cache, metrics, search, store
+from utils.storage import (
+    BOOK_COLUMNS, MEMBER_COLUMNS, DATE_FORMAT, TABLE_KEYS, TABLES,
+    ConflictError, get_backend, write_lock,
+)
 
+# Table names used by the cache and the storage backend (utils/storage.py)
+BOOKS = 'books'
+MEMBERS = 'members'
+TRANSACTIONS = 'transactions'
+
+# Materialized "active loans" table: BookID -> {MemberID, Date, TransactionID}.
+# Rebuilt from the transaction log when the log is first read (or rewritten),
+# then advanced by replaying only the rows appended by each Issue/Return.
+_loans_lock = threading.Lock()
+_loans = {'generation': None, 'length': 0, 'by_book': {}, 'by_member': {}, 'frame': None}
+
+# Loan period per member role, in days; a loan held longer is overdue.
+# Set with LIBRARY_LOAN_PERIODS, e.g. "Student=14,Faculty=30"; roles not
+# listed get LIBRARY_LOAN_PERIOD_DAYS (default 14).
+def _loan_periods(spec):
+    """Parses "Role=days,Role=days" into {role: days}."""
+    periods = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        role, sep, days = item.partition('=')
+        if not sep or not days.strip().isdigit():
+            raise ValueError(f"Invalid loan period {item!r} (expected Role=days)")
+        periods[role.strip()] = int(days)
+    return periods
+
+DEFAULT_LOAN_PERIOD_DAYS = int(os.environ.get('LIBRARY_LOAN_PERIOD_DAYS', 14))
+LOAN_PERIOD_DAYS = _loan_periods(os.environ.get('LIBRARY_LOAN_PERIODS', 'Student=14,Faculty=14'))
+
+# Highest numeric TransactionID seen in the log (T001 -> 1), followed
+# incrementally like the active-loans table
+_TRANSACTION_ID = re.compile(r'^T(\d+)$')
+_txn_ids = {'generation': None, 'length': 0, 'max': 0}
+
+# Row positions of recent list-page results, keyed by (table, table version,
+# query, filters), so paging through a filtered list does not re-filter the
+# table for every page. Only results for the current version are kept.
+_RESULT_CACHE_SIZE = 32
+_results_lock = threading.Lock()
+_results = OrderedDict()
+
+# Department and role vocabularies of the forms and filters, kept for the
+# data version of the books and members tables they were read from
+_vocabularies_lock = threading.Lock()
+_vocabularies = {'version': None, 'value': None}
+
+def _serialized(func):
+    """Runs a write path under the storage write lock, so its validation
+    reads and its write happen as one step across all workers."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with write_lock():
+            return func(*args, **kwargs)
+    return wrapper
+
+@metrics.timed('data_manager.load_books')
+def load_books():
+    """Loads books table (served from the in-process cache when unchanged)"""
+    return cache.get_table(BOOKS)
+
+@metrics.timed('data_manager.load_members')
+def load_members():
+    """Loads members table (served from the in-process cache when unchanged)"""
+    return cache.get_table(MEMBERS)
+
+@metrics.timed('data_manager.load_transactions')
+def load_transactions():
+    """Loads transactions table (served from the in-process cache when unchanged)"""
+    return cache.get_table(TRANSACTIONS)
+
+@metrics.timed('data_manager.load_data')
 def load_data():
-    """Loads all CSVs into DataFrames"""
-    books = pd.read_csv(BOOKS_FILE)
-    members = pd.read_csv(MEMBERS_FILE)
-    transactions = pd.read_csv(TRANSACTIONS_FILE)
-    return books, members, transactions
+    """Loads all tables into DataFrames"""
+    return load_books(), load_members(), load_transactions()
+
+def data_version(*tables):
+    """
+    A short token that changes whenever one of `tables` (default: all of
+    them) changes. Every write path here commits through the storage
+    backend, which gives the written tables a new signature, so each
+    mutation bumps it; so do writes by other workers and manual edits.
+    All workers derive the same token for the same data.
+    """
+    backend = get_backend()
+    signatures = [backend.signature(table) for table in tables or TABLES]
+    return hashlib.sha1(repr(signatures).encode()).hexdigest()[:16]
+
+@metrics.timed('data_manager.vocabularies')
+def vocabularies():
+    """{'departments', 'roles'}: sorted values in use, recomputed only when the data version moves."""
+    version = data_version(BOOKS, MEMBERS)
+    with _vocabularies_lock:
+        if _vocabularies['version'] == version:
+            return _vocabularies['value']
+    books, _, _ = cache.peek_table(BOOKS)
+    members, _, _ = cache.peek_table(MEMBERS)
+    value = {
+        'departments': sorted(
+            set(books['Department'].dropna().astype(str).tolist())
+            | set(members['Department'].dropna().astype(str).tolist())
+        ),
+        'roles': sorted(members['Role'].dropna().astype(str).unique().tolist()),
+    }
+    with _vocabularies_lock:
+        _vocabularies.update(version=version, value=value)
+    return value
+
+def _max_transaction_number(ids):
+    numbers = pd.Series(ids, dtype=object).astype(str).str.extract(_TRANSACTION_ID)[0]
+    numbers = pd.to_numeric(numbers, errors='coerce')
+    return int(numbers.max()) if numbers.notna().any() else 0
+
+def next_transaction_id():
+    """
+    Allocates the ID for the next transaction row: one past both the
+    highest existing T<number> and the row count, so IDs never repeat.
+    Call it while holding write_lock() and log the row before releasing it.
+    """
+    return next_transaction_ids(1)[0]
+
+def next_transaction_ids(count):
+    """Allocates `count` consecutive transaction IDs (see next_transaction_id)."""
+    state = _txn_ids
+    with write_lock():
+        generation, length = cache.table_shape(TRANSACTIONS)
+        if generation != state['generation'] or length < state['length']:
+            transactions, generation, _ = cache.peek_table(TRANSACTIONS)
+            state.update(generation=generation, length=len(transactions),
+                         max=_max_transaction_number(transactions['TransactionID']))
+        elif length > state['length']:
+            _, length, rows = cache.read_tail(TRANSACTIONS, state['length'])
+            new_max = _max_transaction_number([row['TransactionID'] for row in rows])
+            state.update(length=length, max=max(state['max'], new_max))
+        first = max(state['max'], state['length']) + 1
+        return [f"T{number:03d}" for number in range(first, first + count)]
+
+@metrics.timed('data_manager.get_book')
+def get_book(book_id):
+    """Returns the book record as a dict (indexed lookup), or None."""
+    return store.lookup(BOOKS, 'BookID', book_id)
+
+@metrics.timed('data_manager.get_member')
+def get_member(member_id):
+    """Returns the member record as a dict (indexed lookup), or None."""
+    return store.lookup(MEMBERS, 'MemberID', member_id)
+
+def get_member_transactions(member_id):
+    """Returns the transactions of one member, in log order."""
+    return store.select(TRANSACTIONS, 'MemberID', member_id)
+
+@metrics.timed('data_manager.search_books')
+def search_books(query):
+    """Returns the books matching `query` (ID, title, author, department), best first."""
+    return store.rows(BOOKS, 'BookID', search.search(BOOKS, query))
+
+@metrics.timed('data_manager.suggest_books')
+def suggest_books(prefix, status=None, limit=10):
+    """Autocomplete for book inputs: books whose ID or a title word starts with `prefix`."""
+    filters = {'Status': status} if status else {}
+    books = search.suggest(BOOKS, prefix, limit, **filters)
+    return books[['BookID', 'Title', 'Author', 'Status']].astype(object).fillna('').to_dict('records')
+
+@metrics.timed('data_manager.suggest_members')
+def suggest_members(prefix, role=None, limit=10):
+    """Autocomplete for member inputs: members whose ID or a name word starts with `prefix`."""
+    filters = {'Role': role} if role else {}
+    members = search.suggest(MEMBERS, prefix, limit, **filters)
+    return members[['MemberID', 'Name', 'Role', 'Department']].astype(object).fillna('').to_dict('records')
+
+def _filtered(table, query, filters):
+    """
+    Returns the cached result for a list page: {'df', 'positions', 'ranked'},
+    where positions are the matching rows of the snapshot df, in display
+    order (search rank when there is a query, table order otherwise).
+    """
+    filters = tuple(sorted((col, value) for col, value in filters.items() if value))
+    _, _, version = cache.peek_table(table)
+    key = (table, version, query, filters)
+    with _results_lock:
+        result = _results.get(key)
+        if result is not None:
+            _results.move_to_end(key)
+            return result
+
+    if query:
+        df, positions = store.locate(table, TABLE_KEYS[table], search.search(table, query))
+        positions = np.asarray(positions, dtype=np.intp)
+    else:
+        df, _, _ = cache.peek_table(table)
+        positions = np.arange(len(df))
+    for col, value in filters:
+        positions = positions[(df[col] == value).to_numpy()[positions]]
+    result = {'df': df, 'positions': positions, 'ranked': bool(query), 'order': None}
+
+    with _results_lock:
+        for stale in [k for k in _results if k[0] == table and k[1] != version]:
+            del _results[stale]
+        _results[key] = result
+        while len(_results) > _RESULT_CACHE_SIZE:
+            _results.popitem(last=False)
+    return result
 
-def save_books(books_df):
-    """Saves books DF back to CSV"""
-    books_df.to_csv(BOOKS_FILE, index=False)
+def _result_index(table, result, cursor):
+    """Returns where the record `cursor` sits in a cached result, or None."""
+    pos = store.position(table, TABLE_KEYS[table], cursor)
+    if pos is None:
+        return None
+    positions = result['positions']
+    if result['ranked']:
+        if result['order'] is None:
+            result['order'] = {p: i for i, p in enumerate(positions.tolist())}
+        return result['order'].get(pos)
+    i = int(np.searchsorted(positions, pos))
+    return i if i < len(positions) and positions[i] == pos else None
 
-def save_transactions(transactions_df):
-    """Saves transactions DF back to CSV"""
-    transactions_df.to_csv(TRANSACTIONS_FILE, index=False)
+def _page(table, query, filters, page=1, per_page=20, after=None, before=None):
+    """
+    Returns one page of a filtered list as a dict with the page's rows, the
+    total match count, page numbers and the keys to continue from.
+    `after` / `before` are keyset cursors (the key of the last / first row
+    of the page the user is coming from); `page` is used when neither is
+    given or the cursor row no longer matches.
+    """
+    result = _filtered(table, query, filters)
+    positions = result['positions']
+    total = len(positions)
+
+    start = None
+    cursor = after or before
+    if cursor:
+        index = _result_index(table, result, cursor)
+        if index is not None:
+            start = index + 1 if after else max(0, index - per_page)
+    if start is None:
+        start = (max(page, 1) - 1) * per_page
+
+    window = positions[start:start + per_page]
+    rows = result['df'].iloc[window].to_dict('records')
+    key_column = TABLE_KEYS[table]
+    return {
+        'rows': rows,
+        'total': total,
+        'page': start // per_page + 1,
+        'pages': max(1, -(-total // per_page)),
+        'has_prev': start > 0,
+        'has_next': start + per_page < total,
+        'first_key': rows[0][key_column] if rows else None,
+        'last_key': rows[-1][key_column] if rows else None,
+    }
+
+@metrics.timed('data_manager.page_books')
+def page_books(query='', department=None, status=None, **paging):
+    """One page of the inventory list (see _page for the paging arguments)."""
+    return _page(BOOKS, query, {'Department': department, 'Status': status}, **paging)
+
+@metrics.timed('data_manager.page_members')
+def page_members(query='', role=None, department=None, **paging):
+    """One page of the members directory (see _page for the paging arguments)."""
+    return _page(MEMBERS, query, {'Role': role, 'Department': department}, **paging)
+
+def _record_circulation(book, status, transaction):
+    """
+    Changes a book's Status and logs the transaction in one write.
+    The status update only applies if the book still has the status it was
+    validated with; returns False if another request changed it first.
+    """
+    position = store.position(BOOKS, 'BookID', book['BookID'])
+    try:
+        cache.commit([
+            ('update', BOOKS, position, {'Status': status}, {'Status': book['Status']}),
+            ('append', TRANSACTIONS, [transaction]),
+        ])
+    except ConflictError:
+        return False
+    return True
 
+@metrics.timed('data_manager.add_new_book')
+@_serialized
 def add_new_book(data):
     """Adds a new book if ID is unique."""
-    books, _, _ = load_data()
-    
     # Tiny Safety: Check for empty strings
     if not data['BookID'] or not data['Title'] or not data['Author']:
         return False, "All fields are required."
 
-    if data['BookID'] in books['BookID'].values:
+    if get_book(data['BookID']) is not None:
         return False, "Book ID already exists."
     
     # Ensure correct columns
-    new_book = pd.DataFrame([{
+    new_book = {
         'BookID': data['BookID'],
         'Title': data['Title'],
         'Author': data['Author'],
         'Department': data['Department'],
         'Status': 'Available'
-    }])
+    }
     
-    books = pd.concat([books, new_book], ignore_index=True)
-    save_books(books)
+    cache.append_rows(BOOKS, [new_book])
     return True, "Book added successfully."
 
+@metrics.timed('data_manager.add_new_member')
+@_serialized
 def add_new_member(data):
     """Adds a new member if ID is unique."""
-    _, members, _ = load_data()
-    
     # Tiny Safety: Check for empty strings
     if not data['MemberID'] or not data['Name']:
         return False, "ID and Name are required."
 
-    if data['MemberID'] in members['MemberID'].values:
+    if get_member(data['MemberID']) is not None:
         return False, "Member ID already exists."
         
-    new_member = pd.DataFrame([{
+    new_member = {
         'MemberID': data['MemberID'],
         'Name': data['Name'],
         'Role': data['Role'],
         'Department': data['Department'],
         'Batch': data['Batch']
-    }])
+    }
     
-    # Save back to CSV directly to handle differing columns gracefully if needed
-    # but here we follow the strict schema
-    members = pd.concat([members, new_member], ignore_index=True)
-    members.to_csv(MEMBERS_FILE, index=False)
+    cache.append_rows(MEMBERS, [new_member])
     return True, "Member registered successfully."
 
+@metrics.timed('data_manager.issue_book')
+@_serialized
 def issue_book(book_id, member_id):
     """
     Issues a book to a member.
     Returns (Success: bool, Message: str)
     """
-    books, members, transactions = load_data()
-
     # 1. Validation
-    if book_id not in books['BookID'].values:
+    book = get_book(book_id)
+    if book is None:
         return False, "Book ID not found."
-    if member_id not in members['MemberID'].values:
+    if get_member(member_id) is None:
         return False, "Member ID not found."
     
-    book_row_idx = books.index[books['BookID'] == book_id][0]
-    if books.at[book_row_idx, 'Status'] == 'Issued':
+    if book['Status'] == 'Issued':
         return False, "Book is already issued."
 
-    # 2. Update Books Status
-    books.at[book_row_idx, 'Status'] = 'Issued'
-    save_books(books)
-
-    # 3. Add Transaction
+    # 2. Update Books Status and add Transaction (appended, the log is never rewritten)
     new_transaction = {
-        'TransactionID': f"T{len(transactions) + 1:03d}",
+        'TransactionID': next_transaction_id(),
         'BookID': book_id,
         'MemberID': member_id,
-        'Date': datetime.now().strftime('%Y-%m-%d'),
+        'Date': datetime.now().strftime(DATE_FORMAT),
         'Action': 'Issue'
     }
-    # Using pd.concat instead of append (deprecated)
-    new_interactions_df = pd.DataFrame([new_transaction])
-    transactions = pd.concat([transactions, new_interactions_df], ignore_index=True)
-    save_transactions(transactions)
+    if not _record_circulation(book, 'Issued', new_transaction):
+        return False, "Book is already issued."
 
     return True, f"Book {book_id} issued to {member_id} successfully."
 
+@metrics.timed('data_manager.return_book')
+@_serialized
 def return_book(book_id):
     """
     Returns a book.
     Returns (Success: bool, Message: str)
     """
-    books, members, transactions = load_data()
-
-    if book_id not in books['BookID'].values:
+    book = get_book(book_id)
+    if book is None:
         return False, "Book ID not found."
     
-    book_row_idx = books.index[books['BookID'] == book_id][0]
-    if books.at[book_row_idx, 'Status'] == 'Available':
+    if book['Status'] == 'Available':
         return False, "Book is already available."
 
-    # 1. Update Books Status
-    books.at[book_row_idx, 'Status'] = 'Available'
-    save_books(books)
-
-    # 2. Add Transaction
+    # Update Books Status and add Transaction (appended, the log is never rewritten)
     new_transaction = {
-        'TransactionID': f"T{len(transactions) + 1:03d}",
+        'TransactionID': next_transaction_id(),
         'BookID': book_id,
         'MemberID': 'N/A', # Return doesn't necessarily need a member if we just scan the book
-        'Date': datetime.now().strftime('%Y-%m-%d'),
+        'Date': datetime.now().strftime(DATE_FORMAT),
         'Action': 'Return'
     }
-    new_interactions_df = pd.DataFrame([new_transaction])
-    transactions = pd.concat([transactions, new_interactions_df], ignore_index=True)
-    save_transactions(transactions)
+    if not _record_circulation(book, 'Available', new_transaction):
+        return False, "Book is already available."
 
     return True, f"Book {book_id} returned successfully."
 
+# --- Batch operations ---
+# Each batch is validated as a whole with vectorized lookups against the
+# cached tables and applied in a single write. Rows that fail validation are
+# skipped and reported as {'row': index in the batch, 'field': the column at
+# fault, 'id': its value, 'error': message}, with the same messages as the
+# one-at-a-time functions above.
+def _batch_frame(rows, columns):
+    """Normalizes a list of dicts to a DataFrame of stripped strings ('' when missing)."""
+    # object dtype, so a numeric ID stays 5 rather than becoming the float 5.0
+    batch = pd.DataFrame(list(rows), dtype=object).reindex(columns=columns)
+    batch = batch.astype(object).where(batch.notna(), '')
+    return batch.apply(lambda col: col.astype(str).str.strip()).reset_index(drop=True)
+
+def _errors(batch):
+    """Per batch row: the error message ('' when valid) and the column at fault."""
+    return pd.DataFrame({'error': '', 'field': ''}, index=batch.index, dtype=object)
+
+def _valid(errors):
+    return errors['error'] == ''
+
+def _flag(errors, mask, message, field):
+    """Records `message` about `field` for the rows in `mask` that have no error yet."""
+    rows = mask.to_numpy() & _valid(errors).to_numpy()
+    errors.loc[rows, ['error', 'field']] = [message, field]
+
+def _failures(batch, errors):
+    """One {'row', 'field', 'id', 'error'} dict per failed row."""
+    failed = errors[~_valid(errors)]
+    return [
+        {'row': int(i), 'field': field, 'id': batch.at[i, field], 'error': message}
+        for i, message, field in zip(failed.index, failed['error'], failed['field'])
+    ]
+
+@metrics.timed('data_manager.add_books')
+@_serialized
+def add_books(rows):
+    """
+    Adds many books in one write; rows are dicts with BookID, Title,
+    Author and Department. Returns (added BookIDs, failures).
+    """
+    batch = _batch_frame(rows, ['BookID', 'Title', 'Author', 'Department'])
+    errors = _errors(batch)
+    _flag(errors, batch[['BookID', 'Title', 'Author']].eq('').any(axis=1), "All fields are required.", 'BookID')
+    existing = cache.peek_table(BOOKS)[0]['BookID']
+    _flag(errors, batch['BookID'].isin(existing), "Book ID already exists.", 'BookID')
+    _flag(errors, batch['BookID'].duplicated(), "Book ID appears more than once in this batch.", 'BookID')
+
+    added = batch[_valid(errors)].assign(Status='Available')[BOOK_COLUMNS]
+    if not added.empty:
+        cache.append_rows(BOOKS, added.to_dict('records'))
+    return added['BookID'].tolist(), _failures(batch, errors)
+
+@metrics.timed('data_manager.add_members')
+@_serialized
+def add_members(rows):
+    """
+    Registers many members in one write; rows are dicts with MemberID,
+    Name, Role, Department and Batch. Returns (added MemberIDs, failures).
+    """
+    batch = _batch_frame(rows, MEMBER_COLUMNS)
+    errors = _errors(batch)
+    _flag(errors, batch[['MemberID', 'Name']].eq('').any(axis=1), "ID and Name are required.", 'MemberID')
+    existing = cache.peek_table(MEMBERS)[0]['MemberID']
+    _flag(errors, batch['MemberID'].isin(existing), "Member ID already exists.", 'MemberID')
+    _flag(errors, batch['MemberID'].duplicated(), "Member ID appears more than once in this batch.", 'MemberID')
+
+    added = batch[_valid(errors)]
+    if not added.empty:
+        cache.append_rows(MEMBERS, added.to_dict('records'))
+    return added['MemberID'].tolist(), _failures(batch, errors)
+
+def _circulate_batch(batch, errors, status, action):
+    """
+    Applies the rows of a validated issue/return batch that have no error:
+    every status update and the whole block of transactions in one commit.
+    """
+    valid = batch[_valid(errors)]
+    if valid.empty:
+        return []
+    books, positions = store.locate(BOOKS, 'BookID', valid['BookID'])
+    old_status = books['Status'].iloc[positions].tolist()
+    ids = next_transaction_ids(len(valid))
+    today = datetime.now().strftime(DATE_FORMAT)
+    transactions = [
+        {'TransactionID': tid, 'BookID': row.BookID, 'MemberID': row.MemberID,
+         'Date': today, 'Action': action}
+        for tid, row in zip(ids, valid.itertuples(index=False))
+    ]
+    ops = [
+        ('update', BOOKS, pos, {'Status': status}, {'Status': old})
+        for pos, old in zip(positions, old_status)
+    ]
+    try:
+        cache.commit(ops + [('append', TRANSACTIONS, transactions)])
+    except ConflictError:
+        _flag(errors, _valid(errors), "Book status changed concurrently, batch not applied.", 'BookID')
+        return []
+    return valid['BookID'].tolist()
+
+@metrics.timed('data_manager.issue_books')
+@_serialized
+def issue_books(items):
+    """
+    Issues many books at once; items are dicts with BookID and MemberID.
+    Returns (issued BookIDs, failures).
+    """
+    batch = _batch_frame(items, ['BookID', 'MemberID'])
+    books = store.take(BOOKS, 'BookID', batch['BookID'], ['BookID', 'Status'])
+    members = store.take(MEMBERS, 'MemberID', batch['MemberID'], ['MemberID'])
+    errors = _errors(batch)
+    _flag(errors, books['BookID'].isna(), "Book ID not found.", 'BookID')
+    _flag(errors, members['MemberID'].isna(), "Member ID not found.", 'MemberID')
+    _flag(errors, books['Status'] == 'Issued', "Book is already issued.", 'BookID')
+    _flag(errors, batch['BookID'].duplicated(), "Book appears more than once in this batch.", 'BookID')
+
+    issued = _circulate_batch(batch, errors, 'Issued', 'Issue')
+    return issued, _failures(batch, errors)
+
+@metrics.timed('data_manager.return_books')
+@_serialized
+def return_books(book_ids):
+    """Returns many books at once. Returns (returned BookIDs, failures)."""
+    batch = _batch_frame(({'BookID': book_id} for book_id in book_ids), ['BookID'])
+    batch['MemberID'] = 'N/A'
+    books = store.take(BOOKS, 'BookID', batch['BookID'], ['BookID', 'Status'])
+    errors = _errors(batch)
+    _flag(errors, books['BookID'].isna(), "Book ID not found.", 'BookID')
+    _flag(errors, books['Status'] == 'Available', "Book is already available.", 'BookID')
+    _flag(errors, batch['BookID'].duplicated(), "Book appears more than once in this batch.", 'BookID')
+
+    returned = _circulate_batch(batch, errors, 'Available', 'Return')
+    return returned, _failures(batch, errors)
+
+@metrics.timed('data_manager.get_transaction_history')
 def get_transaction_history():
     """
     Returns a merged DataFrame with Book Titles and Member Names.
@@ -158,116 +541,331 @@ def get_transaction_history():
     
     # Sort by TransactionID descending (newest first)
     merged = merged.sort_values(by='TransactionID', ascending=False)
+    merged['Date'] = merged['Date'].dt.strftime(DATE_FORMAT)
     
     return merged.to_dict('records')
 
+def _history_positions(df, candidates, limit, offset, action, date_from, date_to):
+    """
+    Walks candidate row positions (chunks of descending numpy arrays) and
+    returns the positions of rows offset..offset+limit that pass the
+    action/date filters, plus whether more matches follow.
+    """
+    found = []
+    skip = offset
+    for chunk in candidates:
+        matches = chunk[_transaction_mask(df, chunk, action, date_from, date_to)]
+        if skip:
+            matches, skip = matches[skip:], max(0, skip - len(matches))
+        found.extend(matches.tolist())
+        if len(found) > limit:
+            return found[:limit], True
+    return found, False
+
+def _transaction_mask(df, chunk, action, date_from, date_to):
+    """Which of the rows at positions `chunk` pass the action/date filters."""
+    mask = np.ones(len(chunk), dtype=bool)
+    if action:
+        mask &= (df['Action'].iloc[chunk] == action).to_numpy()
+    if date_from is not None:
+        mask &= (df['Date'].iloc[chunk] >= date_from).to_numpy()
+    if date_to is not None:
+        mask &= (df['Date'].iloc[chunk] <= date_to).to_numpy()
+    return mask
+
+def _join_names(rows):
+    """Adds the book Title and member Name to transaction rows (index 0..n-1)."""
+    titles = store.take(BOOKS, 'BookID', rows['BookID'], ['Title'])
+    names = store.take(MEMBERS, 'MemberID', rows['MemberID'], ['Name'])
+    rows['Title'] = titles['Title'].astype(object)
+    rows['Name'] = names['Name'].astype(object).fillna('Library')
+    return rows
+
+def _descending_chunks(end, size):
+    """Yields arrays of row positions end-1, end-2, ..., 0 in growing chunks."""
+    while end > 0:
+        start = max(0, end - size)
+        yield np.arange(end - 1, start - 1, -1)
+        end = start
+        size = min(size * 2, 65536)
+
+@metrics.timed('data_manager.query_transactions')
+def query_transactions(limit=10, offset=0, before=None, member_id=None, book_id=None,
+                       action=None, date_from=None, date_to=None):
+    """
+    Returns (records, next cursor): up to `limit` transactions, newest
+    (last logged) first, joined with the book Title and member Name.
+    Only the selected rows are joined, so the cost follows `limit` rather
+    than the size of the history. Filters: member_id, book_id, action and
+    an inclusive date_from/date_to range (YYYY-MM-DD). `before` is the
+    TransactionID cursor returned by the previous page; `offset` skips
+    matches. The cursor is None when there are no more matches.
+    """
+    date_from = pd.Timestamp(date_from) if date_from else None
+    date_to = pd.Timestamp(date_to) if date_to else None
+
+    # Row positions the member/book indexes allow (all rows otherwise)
+    allowed = None
+    for column, key in (('MemberID', member_id), ('BookID', book_id)):
+        if key:
+            rows = set(store.positions(TRANSACTIONS, column, key))
+            allowed = rows if allowed is None else allowed & rows
+    end = None
+    if before:
+        end = store.position(TRANSACTIONS, 'TransactionID', before)
+        if end is None:
+            return [], None
+    df, _, _ = cache.peek_table(TRANSACTIONS)
+    end = len(df) if end is None else end
+
+    if allowed is not None:
+        chunks = [np.array(sorted((p for p in allowed if p < end), reverse=True), dtype=np.intp)]
+    else:
+        chunks = _descending_chunks(end, max(4 * (limit + offset), 64))
+    positions, more = _history_positions(df, chunks, limit, offset, action, date_from, date_to)
+
+    rows = _join_names(df.iloc[positions].reset_index(drop=True))
+    rows['Date'] = rows['Date'].dt.strftime(DATE_FORMAT)
+    records = rows.astype(object).where(rows.notna(), None).to_dict('records')
+    cursor = records[-1]['TransactionID'] if more and records else None
+    return records, cursor
+
+def loan_periods(roles):
+    """Loan period in days for each member role in `roles` (a Series)."""
+    periods = roles.astype(object).map(LOAN_PERIOD_DAYS)
+    return periods.fillna(DEFAULT_LOAN_PERIOD_DAYS).astype('int64')
+
+def days_since(dates, today=None):
+    """Whole days from each date in `dates` (a datetime Series) to today."""
+    today = pd.Timestamp(today or datetime.now()).normalize()
+    return (today - dates.dt.normalize()).dt.days
+
+# --- Export ---
+# Exports walk the table snapshot in chunks of rows, so a caller streaming
+# them out holds one chunk at a time rather than the whole table as dicts.
+EXPORT_CHUNK_ROWS = 10000
+
+def _chunks(df, positions, size):
+    for start in range(0, len(positions), size):
+        yield df.iloc[positions[start:start + size]]
+
+@metrics.timed('data_manager.export_books')
+def export_books(query='', department=None, status=None, chunk_size=EXPORT_CHUNK_ROWS):
+    """The inventory list (filtered like page_books) as a generator of DataFrame chunks."""
+    result = _filtered(BOOKS, query, {'Department': department, 'Status': status})
+    return _chunks(result['df'], result['positions'], chunk_size)
+
+@metrics.timed('data_manager.export_members')
+def export_members(query='', role=None, department=None, chunk_size=EXPORT_CHUNK_ROWS):
+    """The members directory (filtered like page_members) as a generator of DataFrame chunks."""
+    result = _filtered(MEMBERS, query, {'Role': role, 'Department': department})
+    return _chunks(result['df'], result['positions'], chunk_size)
+
+@metrics.timed('data_manager.export_transactions')
+def export_transactions(member_id=None, book_id=None, action=None, date_from=None, date_to=None,
+                        history=False, chunk_size=EXPORT_CHUNK_ROWS):
+    """
+    The transaction log as a generator of DataFrame chunks, with the same
+    filters as query_transactions. In log order, or with history=True
+    newest first and joined with the book Title and member Name.
+    """
+    date_from = pd.Timestamp(date_from) if date_from else None
+    date_to = pd.Timestamp(date_to) if date_to else None
+    allowed = None
+    for column, key in (('MemberID', member_id), ('BookID', book_id)):
+        if key:
+            rows = set(store.positions(TRANSACTIONS, column, key))
+            allowed = rows if allowed is None else allowed & rows
+    df, _, _ = cache.peek_table(TRANSACTIONS)
+
+    if allowed is not None:
+        positions = np.array(sorted(allowed, reverse=history), dtype=np.intp)
+        chunks = (positions[i:i + chunk_size] for i in range(0, len(positions), chunk_size))
+    elif history:
+        chunks = (np.arange(end - 1, max(0, end - chunk_size) - 1, -1)
+                  for end in range(len(df), 0, -chunk_size))
+    else:
+        chunks = (np.arange(start, min(start + chunk_size, len(df)))
+                  for start in range(0, len(df), chunk_size))
+
+    def generate():
+        for chunk in chunks:
+            rows = df.iloc[chunk[_transaction_mask(df, chunk, action, date_from, date_to)]]
+            if history:
+                rows = _join_names(rows.reset_index(drop=True))
+            yield rows
+    return generate()
+
+@metrics.timed('data_manager.get_member_history')
 def get_member_history(member_id):
     """
     Returns history for a specific member.
     """
-    books, members, transactions = load_data()
-    
-    # Filter transactions for this member
-    member_tx = transactions[transactions['MemberID'] == member_id].copy()
+    # Filter transactions for this member (MemberID index)
+    member_tx = get_member_transactions(member_id).reset_index(drop=True)
     
     if member_tx.empty:
         return []
         
-    # Merge with Books
-    merged = pd.merge(member_tx, books[['BookID', 'Title', 'Author']], on='BookID', how='left')
+    # Attach book details through the BookID index
+    details = store.take(BOOKS, 'BookID', member_tx['BookID'], ['Title', 'Author'])
+    merged = pd.concat([member_tx, details], axis=1)
     
     # Sort by Date descending
     merged = merged.sort_values(by='Date', ascending=False)
     
-    # Calculate Overdue Status (Simple Logic: Issue > 14 days ago)
-    records = merged.to_dict('records')
-    today = datetime.now().date()
-    
-    for record in records:
-        if record['Action'] == 'Issue':
-            tx_date = datetime.strptime(record['Date'], '%Y-%m-%d').date()
-            delta = (today - tx_date).days
-            record['DaysAgo'] = delta
-            record['Overdue'] = delta > 14
-        else:
-            record['Overdue'] = False
-            
-    return records
+    # Calculate Overdue Status (Simple Logic: Issue longer ago than the loan period)
+    member = get_member(member_id)
+    period = loan_periods(pd.Series([member['Role'] if member else None]))[0]
+    days = days_since(merged['Date'])
+    merged['DaysAgo'] = days
+    merged['Overdue'] = (merged['Action'] == 'Issue') & (days > period)
+    merged['Date'] = merged['Date'].dt.strftime(DATE_FORMAT)
+
+    return merged.to_dict('records')
+
+def _apply_loan_event(state, row):
+    """Advances the active-loans table by one transaction row."""
+    bid = row['BookID']
+    previous = state['by_book'].pop(bid, None)
+    if previous is not None:
+        state['by_member'].get(previous['MemberID'], set()).discard(bid)
+    if row['Action'] == 'Issue':
+        state['by_book'][bid] = {
+            'MemberID': row['MemberID'],
+            'Date': row['Date'],
+            'TransactionID': row['TransactionID'],
+        }
+        state['by_member'].setdefault(row['MemberID'], set()).add(bid)
+
+def _rebuild_loans(state):
+    """Rebuilds the active-loans table from the whole log in one pass."""
+    transactions, generation, _ = cache.peek_table(TRANSACTIONS)
+    # A book is on loan when its most recent transaction is an Issue
+    last = (
+        transactions.sort_values(by='Date', kind='stable')
+        .drop_duplicates(subset='BookID', keep='last')
+    )
+    last = last[last['Action'] == 'Issue']
+
+    state.update(generation=generation, length=len(transactions), by_book={}, by_member={}, frame=None)
+    for row in last[['BookID', 'MemberID', 'Date', 'TransactionID']].to_dict('records'):
+        state['by_book'][row['BookID']] = {
+            'MemberID': row['MemberID'],
+            'Date': row['Date'],
+            'TransactionID': row['TransactionID'],
+        }
+        state['by_member'].setdefault(row['MemberID'], set()).add(row['BookID'])
 
+def _current_loans_state():
+    """Returns the active-loans table, brought up to date with the log."""
+    state = _loans
+    generation, length = cache.table_shape(TRANSACTIONS)
+    rows = []
+    if generation == state['generation'] and length > state['length']:
+        generation, length, rows = cache.read_tail(TRANSACTIONS, state['length'])
+    if generation != state['generation'] or length < state['length']:
+        _rebuild_loans(state)
+    else:
+        for row in rows:
+            _apply_loan_event(state, row)
+        if rows:
+            state['frame'] = None
+        state['length'] = length
+    return state
+
+@metrics.timed('data_manager.active_loans_frame')
+def active_loans_frame():
+    """
+    Returns the active-loans table as a DataFrame (BookID, MemberID, Date,
+    TransactionID), oldest loans first. Shared until the next Issue/Return;
+    do not modify it.
+    """
+    with _loans_lock:
+        state = _current_loans_state()
+        if state['frame'] is None:
+            loans = state['by_book']
+            frame = pd.DataFrame({
+                'BookID': list(loans),
+                'MemberID': [loan['MemberID'] for loan in loans.values()],
+                'Date': pd.to_datetime([loan['Date'] for loan in loans.values()]),
+                'TransactionID': [loan['TransactionID'] for loan in loans.values()],
+            })
+            state['frame'] = frame.sort_values(['Date', 'TransactionID'], kind='stable').reset_index(drop=True)
+        return state['frame']
+
+def count_member_loans(member_id):
+    """Returns how many books a member currently holds."""
+    with _loans_lock:
+        return len(_current_loans_state()['by_member'].get(member_id, ()))
+
+@metrics.timed('data_manager.get_member_current_loans')
 def get_member_current_loans(member_id):
     """
-    Replays transaction history to find currently holding books.
+    Looks up the books a member currently holds in the active-loans table.
     Returns list of dicts with Overdue status.
     """
-    _, _, transactions = load_data()
-    # Filter for member
-    txs = transactions[transactions['MemberID'] == member_id].sort_values(by='Date')
-    
-    loans = {} # BookID -> {Date, TransactionID}
-    
-    for _, row in txs.iterrows():
-        bid = row['BookID']
-        if row['Action'] == 'Issue':
-            loans[bid] = row
-        elif row['Action'] == 'Return':
-            if bid in loans:
-                del loans[bid]
-                
-    # Now loans contains only active books
-    active_loans = []
-    # Removed inner import causing UnboundLocalError
-    books, _, _ = load_data()
-    today = datetime.now().date()
-    
-    for bid, row in loans.items():
-        # Get Book details
-        book_info = books[books['BookID'] == bid].iloc[0]
-        issue_date = datetime.strptime(row['Date'], '%Y-%m-%d').date()
-        delta = (today - issue_date).days
-        
-        active_loans.append({
-            'BookID': bid,
-            'Title': book_info['Title'],
-            'Author': book_info['Author'],
-            'Date': row['Date'],
-            'DaysHeld': delta,
-            'Overdue': delta > 14
-        })
-        
-    return active_loans
+    with _loans_lock:
+        state = _current_loans_state()
+        loans = [
+            (bid, dict(state['by_book'][bid]))
+            for bid in state['by_member'].get(member_id, ())
+        ]
+    if not loans:
+        return []
+    # Oldest loans first, as a replay of the history would list them
+    loans.sort(key=lambda item: (item[1]['Date'], item[1]['TransactionID']))
 
+    active = pd.DataFrame({
+        'BookID': [bid for bid, _ in loans],
+        'Date': pd.to_datetime([row['Date'] for _, row in loans]),
+    })
+    # Get Book details
+    details = store.take(BOOKS, 'BookID', active['BookID'], ['Title', 'Author'])
+    member = get_member(member_id)
+    period = loan_periods(pd.Series([member['Role'] if member else None]))[0]
+    days = days_since(active['Date'])
+
+    active_loans = pd.DataFrame({
+        'BookID': active['BookID'],
+        'Title': details['Title'].astype(object).where(details['Title'].notna(), None),
+        'Author': details['Author'].astype(object).where(details['Author'].notna(), None),
+        'Date': active['Date'].dt.strftime(DATE_FORMAT),
+        'DaysHeld': days,
+        'Overdue': days > period,
+    })
+    return active_loans.to_dict('records')
+
+@metrics.timed('data_manager.delete_book')
+@_serialized
 def delete_book(book_id):
     """
     Deletes a book if it is NOT currently issued.
     """
-    books, _, _ = load_data()
-    
-    if book_id not in books['BookID'].values:
+    book = get_book(book_id)
+    if book is None:
         return False, "Book not found."
         
-    book = books[books['BookID'] == book_id].iloc[0]
     if book['Status'] == 'Issued':
         return False, "Cannot delete. Book is currently Issued."
         
     # Delete
-    books = books[books['BookID'] != book_id]
-    save_books(books)
+    cache.commit([('delete', BOOKS, store.position(BOOKS, 'BookID', book_id))])
     return True, "Book deleted successfully."
 
+@metrics.timed('data_manager.delete_member')
+@_serialized
 def delete_member(member_id):
     """
     Deletes a member if they have NO active loans.
     """
-    _, members, _ = load_data()
-    
-    if member_id not in members['MemberID'].values:
+    if get_member(member_id) is None:
         return False, "Member not found."
         
-    active_loans = get_member_current_loans(member_id)
+    active_loans = count_member_loans(member_id)
     if active_loans:
-        return False, f"Cannot delete. Member has {len(active_loans)} active loans."
+        return False, f"Cannot delete. Member has {active_loans} active loans."
         
     # Delete
-    members = members[members['MemberID'] != member_id]
-    members.to_csv(MEMBERS_FILE, index=False)
+    cache.commit([('delete', MEMBERS, store.position(MEMBERS, 'MemberID', member_id))])
     return True, "Member deleted successfully."
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from utils.data_manager import export_books, export_members, export_transactions
+from utils.storage import BOOK_COLUMNS, MEMBER_COLUMNS, TRANSACTION_COLUMNS, DATE_FORMAT
+
+# Encoders for the /export routes: turn a generator of DataFrame chunks
+# (see the export_* functions in utils/data_manager.py) into a generator of
+# text, so a response can stream a table of any size one chunk at a time.
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Filters an export accepts (those of the list pages and /api/transactions),
+# with their defaults
+FILTERS = {
+    'query': '', 'department': '', 'status': '', 'role': '',
+    'member_id': None, 'book_id': None, 'action': None, 'date_from': None, 'date_to': None,
+}
+
+# Exportable tables: name -> (columns, function starting the export from FILTERS)
+EXPORTS = {
+    'books': (BOOK_COLUMNS, lambda f: export_books(f['query'], department=f['department'], status=f['status'])),
+    'members': (MEMBER_COLUMNS, lambda f: export_members(f['query'], role=f['role'], department=f['department'])),
+    'transactions': (TRANSACTION_COLUMNS, lambda f: export_transactions(
+        f['member_id'], f['book_id'], f['action'], f['date_from'], f['date_to'])),
+    'history': (TRANSACTION_COLUMNS + ['Title', 'Name'], lambda f: export_transactions(
+        f['member_id'], f['book_id'], f['action'], f['date_from'], f['date_to'], history=True)),
+}
+
+
+def _prepare(chunk):
+    """Formats dates as in the CSV files and turns categoricals back into plain values."""
+    columns = {}
+    for col, values in chunk.items():
+        if pd.api.types.is_datetime64_any_dtype(values):
+            columns[col] = values.dt.strftime(DATE_FORMAT)
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            columns[col] = values.astype(object)
+    return chunk.assign(**columns) if columns else chunk
+
+
+def encode(chunks, fmt, columns):
+    """
+    Yields the rows of `chunks` as `fmt` text. A CSV starts with the header
+    line before the first chunk is read, so the download starts at once.
+    """
+    if fmt == 'csv':
+        yield pd.DataFrame(columns=columns).to_csv(index=False)
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        chunk = _prepare(chunk[columns])
+        if fmt == 'csv':
+            yield chunk.to_csv(index=False, header=False)
+        else:
+            yield chunk.to_json(orient='records', lines=True, force_ascii=False).rstrip('\n') + '\n'
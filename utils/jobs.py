@@ -0,0 +1,453 @@
+"""
+Background jobs: long maintenance and report tasks run outside the request
+workers, and are tracked in a small SQLite job table (data/jobs/jobs.db) so
+their progress and results outlive the request that started them.
+
+    job = jobs.submit('export', {'table': 'transactions', 'format': 'csv'})
+    jobs.get(job['id'])   # {'state': 'running', 'progress': 0.4, ...}
+
+Tasks that rebuild this process's in-memory indexes run on a thread pool.
+The others (data repair, snapshot compaction, exports, reports) run on a
+pool of worker processes, so CPU-heavy work uses the other cores. Worker
+processes read and write the tables through the storage backend, like any
+other worker. LIBRARY_JOB_PROCESSES sets their number (0 runs every task on
+the thread pool) and LIBRARY_JOBS_DIR where the job table and the result
+files are kept. Jobs left unfinished by a process that exited are marked
+failed the next time the table is opened.
+"""
+import functools
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils import cache, storage
+
+JOBS_DIR = Path(os.environ.get('LIBRARY_JOBS_DIR', storage.DATA_DIR / 'jobs'))
+THREADS = int(os.environ.get('LIBRARY_JOB_THREADS', 2))
+PROCESSES = int(os.environ.get('LIBRARY_JOB_PROCESSES', min(2, os.cpu_count() or 1)))
+
+# Finished jobs kept in the table; older ones are pruned with their files
+HISTORY = 200
+# Least number of seconds between two progress writes of a running job
+PROGRESS_INTERVAL = 0.5
+# Changes listed in the result of a repair (the count covers all of them)
+REPAIR_CHANGES_SHOWN = 100
+
+STATES = ('queued', 'running', 'done', 'failed')
+COLUMNS = ['id', 'task', 'params', 'state', 'progress', 'message', 'result', 'error',
+           'owner', 'created', 'started', 'finished']
+
+_lock = threading.Lock()
+_pools = {}
+_ready = set()      # job tables this process has created / recovered
+_worker = {}        # what a worker process was last set up for (see _enter)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def _owner():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name != 'posix':
+        return True  # no cheap check: never fail another process's jobs
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# --- Job table ---
+def _connect(jobs_dir=None):
+    jobs_dir = Path(jobs_dir or JOBS_DIR)
+    if jobs_dir not in _ready:
+        jobs_dir.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(jobs_dir / 'jobs.db', timeout=30)
+    if jobs_dir not in _ready:
+        with _lock:
+            if jobs_dir not in _ready:
+                _create(conn)
+                _recover(conn)
+                _ready.add(jobs_dir)
+    return closing(conn)
+
+
+def _create(conn):
+    with conn:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, task TEXT NOT NULL, params TEXT NOT NULL, '
+            'state TEXT NOT NULL, progress REAL, message TEXT, result TEXT, error TEXT, '
+            'owner TEXT NOT NULL, created TEXT NOT NULL, started TEXT, finished TEXT)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created)')
+
+
+def _recover(conn):
+    """Fails the unfinished jobs of processes on this host that no longer exist."""
+    host = socket.gethostname()
+    rows = conn.execute("SELECT id, owner FROM jobs WHERE state IN ('queued', 'running')").fetchall()
+    with conn:
+        for job_id, owner in rows:
+            owner_host, _, pid = owner.rpartition(':')
+            if owner_host == host and not _alive(int(pid)):
+                conn.execute(
+                    "UPDATE jobs SET state = 'failed', error = ?, finished = ? WHERE id = ?",
+                    ('Interrupted: the process running the job exited.', _now(), job_id),
+                )
+
+
+def _update(job_id, jobs_dir=None, only_unfinished=False, **fields):
+    sql = 'UPDATE jobs SET {} WHERE id = ?'.format(', '.join(f'{col} = ?' for col in fields))
+    if only_unfinished:
+        sql += " AND state IN ('queued', 'running')"
+    with _connect(jobs_dir) as conn, conn:
+        conn.execute(sql, [*fields.values(), job_id])
+
+
+def _record(row):
+    job = dict(zip(COLUMNS, row))
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    del job['owner']
+    return job
+
+
+def get(job_id):
+    """The job as a dict, or None."""
+    with _connect() as conn:
+        row = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _record(row) if row else None
+
+
+def list_jobs(limit=50, state=None):
+    """The most recent jobs, newest first (optionally only those in `state`)."""
+    sql = f"SELECT {', '.join(COLUMNS)} FROM jobs"
+    args = []
+    if state:
+        sql += ' WHERE state = ?'
+        args.append(state)
+    sql += ' ORDER BY created DESC, rowid DESC LIMIT ?'
+    with _connect() as conn:
+        rows = conn.execute(sql, args + [limit]).fetchall()
+    return [_record(row) for row in rows]
+
+
+def output_path(job_id, suffix, jobs_dir=None):
+    """Where a job writes its result file."""
+    return Path(jobs_dir or JOBS_DIR) / f'{job_id}.{suffix}'
+
+
+def _prune():
+    with _connect() as conn, conn:
+        old = [row[0] for row in conn.execute(
+            "SELECT id FROM jobs WHERE state IN ('done', 'failed') "
+            'ORDER BY created DESC, rowid DESC LIMIT -1 OFFSET ?', (HISTORY,)
+        )]
+        conn.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in old])
+    for job_id in old:
+        for path in JOBS_DIR.glob(f'{job_id}.*'):
+            path.unlink(missing_ok=True)
+
+
+# --- Running jobs ---
+class Job:
+    """What a running task sees of its job: progress reports and an output file."""
+
+    def __init__(self, job_id, jobs_dir):
+        self.id = job_id
+        self.jobs_dir = jobs_dir
+        self._reported = 0.0
+
+    def progress(self, fraction=None, message=None):
+        """Records how far the task got (written at most every PROGRESS_INTERVAL)."""
+        now = time.monotonic()
+        if now - self._reported < PROGRESS_INTERVAL:
+            return
+        self._reported = now
+        fields = {'message': message} if message is not None else {}
+        if fraction is not None:
+            fields['progress'] = round(min(max(fraction, 0.0), 1.0), 4)
+        if fields:
+            _update(self.id, self.jobs_dir, **fields)
+
+    def output(self, suffix):
+        return output_path(self.id, suffix, self.jobs_dir)
+
+
+def _context():
+    """What a worker process needs to act on the same data as this one."""
+    backend = storage.get_backend()
+    if backend.name == 'sqlite':
+        spec = ('sqlite', str(backend.db_file))
+    else:
+        spec = ('csv', str(backend.data_dir), backend.snapshots)
+    return {'pid': os.getpid(), 'jobs_dir': str(JOBS_DIR), 'backend': spec}
+
+
+def _enter(context):
+    """In a worker process, points the storage backend at the submitter's data."""
+    if context['pid'] == os.getpid() or _worker.get('backend') == context['backend']:
+        return
+    spec = context['backend']
+    if spec[0] == 'sqlite':
+        storage.set_backend(storage.SqliteStorage(spec[1]))
+    else:
+        storage.set_backend(storage.CsvStorage(spec[1], snapshots=spec[2]))
+    cache.invalidate()
+    _worker['backend'] = spec
+
+
+def _execute(job_id, task, params, context):
+    """Runs one job (on a pool thread or in a worker process) and records the outcome."""
+    jobs_dir = context['jobs_dir']
+    _update(job_id, jobs_dir, state='running', started=_now())
+    try:
+        _enter(context)
+        result = TASKS[task]['run'](Job(job_id, jobs_dir), **params)
+    except Exception as e:
+        _update(job_id, jobs_dir, state='failed', error=f'{type(e).__name__}: {e}', finished=_now())
+    else:
+        _update(job_id, jobs_dir, state='done', progress=1.0, message=None, result=json.dumps(result),
+                finished=_now())
+
+
+def _pool(in_process):
+    kind = 'threads' if in_process or PROCESSES <= 0 else 'processes'
+    with _lock:
+        pool = _pools.get(kind)
+        if pool is None:
+            if kind == 'threads':
+                pool = ThreadPoolExecutor(THREADS, thread_name_prefix='library-job')
+            else:
+                # Fresh interpreters: forking a threaded server is not safe
+                pool = ProcessPoolExecutor(PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+            _pools[kind] = pool
+    return kind, pool
+
+
+def _settled(job_id, kind, future):
+    """Fails a job whose worker died or that never started."""
+    error = 'Cancelled.' if future.cancelled() else future.exception()
+    if error is None:
+        return
+    if isinstance(error, BrokenProcessPool):
+        with _lock:
+            _pools.pop(kind, None)
+    message = error if isinstance(error, str) else f'{type(error).__name__}: {error}'
+    _update(job_id, only_unfinished=True, state='failed', error=message, finished=_now())
+
+
+def _check_params(task, params):
+    spec = TASKS[task]
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object.")
+    unknown = sorted(set(params) - set(spec['params']))
+    if unknown:
+        raise ValueError(f"Unknown parameter(s) for {task}: {', '.join(unknown)}.")
+    params = {**spec['params'], **params}
+    for name, default in spec['params'].items():
+        if not isinstance(params[name], type(default)):
+            raise ValueError(f"{name} must be of type {type(default).__name__}.")
+    if 'check' in spec:
+        spec['check'](**params)
+    return params
+
+
+def submit(task, params=None):
+    """
+    Queues a job running `task` (one of TASKS) with `params`; returns the
+    job. Raises ValueError for an unknown task or invalid parameters.
+    """
+    if task not in TASKS:
+        raise ValueError(f"Unknown task {task!r}.")
+    params = _check_params(task, params or {})
+    job_id = uuid.uuid4().hex
+    with _connect() as conn, conn:
+        conn.execute(
+            'INSERT INTO jobs (id, task, params, state, progress, owner, created) '
+            "VALUES (?, ?, ?, 'queued', 0, ?, ?)",
+            (job_id, task, json.dumps(params), _owner(), _now()),
+        )
+    _prune()
+
+    kind, pool = _pool(TASKS[task]['in_process'])
+    try:
+        future = pool.submit(_execute, job_id, task, params, _context())
+    except (RuntimeError, BrokenProcessPool) as e:
+        with _lock:
+            _pools.pop(kind, None)
+        _update(job_id, state='failed', error=f'{type(e).__name__}: {e}', finished=_now())
+    else:
+        future.add_done_callback(functools.partial(_settled, job_id, kind))
+    return get(job_id)
+
+
+def shutdown(wait=True):
+    """Stops the pools (queued jobs still run when `wait` is true)."""
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
+
+
+# --- Tasks ---
+def _repair(job, dry_run=False):
+    """Sets every book's Status from its last transaction (see utils/sync_data.py)."""
+    from utils import sync_data
+
+    with storage.write_lock():
+        books, _, _ = cache.peek_table('books')
+        job.progress(0.1, "Reading the transaction log")
+        log, _, _ = cache.peek_table('transactions')
+        job.progress(0.5, "Comparing book statuses")
+        _, diff = sync_data.plan_repair(books.assign(Status=books['Status'].astype(object)),
+                                        sync_data.last_actions(log))
+        changes = sync_data.status_updates(diff)
+        if changes and not dry_run:
+            job.progress(0.8, f"Writing {len(changes)} status change(s)")
+            cache.commit(changes)
+    shown = diff.head(REPAIR_CHANGES_SHOWN)
+    return {
+        'dry_run': dry_run,
+        'changed': len(diff),
+        'changes': [
+            {'BookID': book_id, 'Old': old, 'New': new}
+            for book_id, old, new in zip(shown['BookID'], shown['Old'], shown['New'])
+        ],
+    }
+
+
+def _reindex(job):
+    """Re-reads every table and rebuilds the search, lookup, circulation and recommendation indexes."""
+    from utils import aggregates, data_manager, recommend, search, store
+
+    cache.invalidate()
+    counts = {}
+    for step, table in enumerate(storage.TABLES):
+        job.progress(step / 6, f"Reading {table}")
+        counts[table] = cache.table_length(table)
+    for step, table in enumerate(search.SEARCH_FIELDS, 3):
+        job.progress(step / 6, f"Indexing {table} for search")
+        search.rebuild(table)
+    job.progress(5 / 6, "Rebuilding lookups, loans and counters")
+    indexes = store.rebuild()
+    data_manager.active_loans_frame()
+    for table in storage.TABLES:
+        aggregates.count(table)
+    job.progress(None, "Rebuilding recommendations")
+    recommended = recommend.rebuild()
+    return {'rows': counts, 'lookup_indexes': indexes, 'books_with_recommendations': recommended}
+
+
+def _compact(job):
+    """Refreshes the CSV snapshots, or checkpoints the SQLite write-ahead log."""
+    from utils import snapshot
+
+    backend = storage.get_backend()
+    if backend.name == 'sqlite':
+        busy, _, moved = backend.connection().execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        return {'checkpointed_pages': moved, 'busy': bool(busy)}
+    rows = {}
+    for step, table in enumerate(storage.TABLES):
+        job.progress(step / len(storage.TABLES), f"Compacting {table}")
+        rows[table] = snapshot.compact(backend, table)
+    return {'rows': rows}
+
+
+def _check_export(table, format, filters):
+    from utils import export
+
+    if table not in export.EXPORTS:
+        raise ValueError(f"table must be one of {', '.join(export.EXPORTS)}.")
+    if format not in export.FORMATS:
+        raise ValueError(f"format must be one of {', '.join(export.FORMATS)}.")
+    unknown = sorted(set(filters) - set(export.FILTERS))
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(unknown)}.")
+
+
+def _export(job, table, format, filters):
+    """Writes a filtered table export (like /export/<table>.<format>) to a file."""
+    from utils import export
+
+    columns, start = export.EXPORTS[table]
+    rows = 0
+
+    def counted(chunks):
+        nonlocal rows
+        for chunk in chunks:
+            rows += len(chunk)
+            job.progress(None, f"{rows} rows exported")
+            yield chunk
+
+    path = job.output(format)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for text in export.encode(counted(start({**export.FILTERS, **filters})), format, columns):
+            f.write(text)
+    return {'rows': rows, 'bytes': path.stat().st_size, 'file': path.name, 'filename': f'{table}.{format}'}
+
+
+def _check_report(name):
+    from utils import reports
+
+    if name not in reports.REPORTS:
+        raise ValueError(f"name must be one of {', '.join(reports.REPORTS)}.")
+
+
+def _report(job, name):
+    """Writes one of the circulation reports as CSV."""
+    from utils import reports
+
+    job.progress(0.1, f"Building the {name} report")
+    path = job.output('csv')
+    path.write_text(reports.to_csv(name), encoding='utf-8')
+    return {'bytes': path.stat().st_size, 'file': path.name, 'filename': f'{name}.csv'}
+
+
+# Tasks that can be submitted: name -> run(job, **params), parameter defaults,
+# whether it must run in this process (it rebuilds in-memory state), and an
+# optional check(**params) raising ValueError
+TASKS = {
+    'repair': {
+        'run': _repair, 'params': {'dry_run': False}, 'in_process': False,
+        'description': "Sync book statuses with the transaction log.",
+    },
+    'reindex': {
+        'run': _reindex, 'params': {}, 'in_process': True,
+        'description': "Re-read the tables and rebuild this process's indexes.",
+    },
+    'compact': {
+        'run': _compact, 'params': {}, 'in_process': False,
+        'description': "Refresh the CSV snapshots (SQLite: checkpoint the WAL).",
+    },
+    'export': {
+        'run': _export, 'params': {'table': 'transactions', 'format': 'csv', 'filters': {}},
+        'check': _check_export, 'in_process': False,
+        'description': "Export a table, with the filters of /export, to a downloadable file.",
+    },
+    'report': {
+        'run': _report, 'params': {'name': 'overdue'}, 'check': _check_report, 'in_process': False,
+        'description': "Build a circulation report as a downloadable CSV file.",
+    },
+}
@@ -0,0 +1,195 @@
+"""
+In-process instrumentation: call counts and timings of the data layer,
+storage I/O counters and per-request timings, exported in the Prometheus
+text format by the /metrics route.
+
+    @metrics.timed('data_manager.load_data')   # time every call of a function
+    with metrics.timer('storage.parse'): ...  # time a block
+    metrics.inc('library_bytes_written_total', n, table='books')
+
+While a request is being served (begin_request / end_request, wired up in
+app.py), the same hooks also add up per request, so a sampled request can
+report where its time went (see profile_header). Each worker process keeps
+its own metrics; Prometheus sums them when scraping every worker.
+"""
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the request duration histogram buckets
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+HELP = {
+    'library_function_seconds': ('summary', "Time spent in instrumented functions and blocks."),
+    'library_table_reads_total': ('counter', "Tables (re-)read from the storage backend."),
+    'library_rows_written_total': ('counter', "Rows written to the storage backend."),
+    'library_bytes_written_total': ('counter', "Bytes written to the CSV files."),
+    'library_http_requests_total': ('counter', "HTTP requests served."),
+    'library_conditional_responses_total': ('counter', "Versioned reads answered 304, from a kept page, or rendered."),
+    'library_http_request_seconds': ('histogram', "Time to produce an HTTP response."),
+}
+
+_lock = threading.Lock()
+_counters = {}      # (name, labels) -> value
+_summaries = {}     # (name, labels) -> [count, sum]
+_histograms = {}    # (name, labels) -> [bucket counts..., count, sum]
+_local = threading.local()
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Adds `value` to a counter (and to the current request's profile)."""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    profile = getattr(_local, 'profile', None)
+    if profile is not None:
+        profile['counters'][name] = profile['counters'].get(name, 0) + value
+
+
+def observe(name, seconds):
+    """Records one timing of the instrumented function or block `name`."""
+    key = ('library_function_seconds', (('function', name),))
+    with _lock:
+        entry = _summaries.setdefault(key, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+    profile = getattr(_local, 'profile', None)
+    if profile is not None:
+        entry = profile['timings'].setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+@contextmanager
+def timer(name):
+    """Times the enclosed block as `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator: times every call of the function as `name`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# --- Requests ---
+def begin_request():
+    """Starts collecting the profile of the request served by this thread."""
+    _local.profile = {'start': time.perf_counter(), 'timings': {}, 'counters': {}}
+
+
+def end_request(method, endpoint, status):
+    """
+    Records the request in the request metrics and returns its profile:
+    {'seconds', 'timings': {name: [calls, seconds]}, 'counters': {name: value}}.
+    """
+    profile = getattr(_local, 'profile', None)
+    _local.profile = None
+    if profile is None:
+        return None
+    seconds = time.perf_counter() - profile['start']
+    profile['seconds'] = seconds
+    labels = _labels({'method': method, 'endpoint': endpoint, 'status': str(status)})
+    with _lock:
+        key = ('library_http_requests_total', labels)
+        _counters[key] = _counters.get(key, 0) + 1
+        key = ('library_http_request_seconds', _labels({'endpoint': endpoint}))
+        entry = _histograms.setdefault(key, [0] * len(REQUEST_BUCKETS) + [0, 0.0])
+        for i, bound in enumerate(REQUEST_BUCKETS):
+            if seconds <= bound:
+                entry[i] += 1
+        entry[-2] += 1
+        entry[-1] += seconds
+    return profile
+
+
+def discard_request():
+    """Drops the current request's profile (e.g. after an unhandled error)."""
+    _local.profile = None
+
+
+def profile_header(profile):
+    """A Server-Timing header value: one entry per instrumented name, slowest first."""
+    parts = [f"total;dur={profile['seconds'] * 1000:.2f}"]
+    timings = sorted(profile['timings'].items(), key=lambda item: -item[1][1])
+    for name, (calls, seconds) in timings:
+        parts.append(f'{name};dur={seconds * 1000:.2f};desc="{calls} call(s)"')
+    return ', '.join(parts)
+
+
+def profile_line(profile, method, path, status):
+    """A one-line summary of a request profile for the log."""
+    timings = sorted(profile['timings'].items(), key=lambda item: -item[1][1])
+    parts = [f"{name}={seconds * 1000:.1f}ms/{calls}" for name, (calls, seconds) in timings]
+    parts += [f"{name}={value:g}" for name, value in sorted(profile['counters'].items())]
+    return f"{method} {path} {status} {profile['seconds'] * 1000:.1f}ms " + ' '.join(parts)
+
+
+# --- Exposition ---
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in items
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = dict(_counters)
+        summaries = {key: list(value) for key, value in _summaries.items()}
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    lines = []
+    for name, (kind, text) in HELP.items():
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value:g}')
+        elif kind == 'summary':
+            for (metric, labels), (count, total) in sorted(summaries.items()):
+                if metric == name:
+                    lines.append(f'{name}_count{_format_labels(labels)} {count}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {total:.6f}')
+        else:
+            for (metric, labels), entry in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(REQUEST_BUCKETS, entry):
+                    le = '+Inf' if bound == math.inf else f'{bound:g}'
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {count}')
+                lines.append(f'{name}_count{_format_labels(labels)} {entry[-2]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {entry[-1]:.6f}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Clears every metric (for tests and benchmarks)."""
+    with _lock:
+        _counters.clear()
+        _summaries.clear()
+        _histograms.clear()
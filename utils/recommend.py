@@ -0,0 +1,313 @@
+import threading
+
+import numpy as np
+
+try:
+    from scipy import sparse
+except ImportError:  # the co-occurrence blocks are then counted with numpy alone
+    sparse = None
+
+from utils import cache, metrics, store
+
+# "Members who borrowed this also borrowed" recommendations.
+#
+# A is the member x book incidence matrix of the transaction log (1 where a
+# member ever issued a book). Row b of the co-occurrence matrix A^T A counts,
+# for every other book, the members who borrowed both; each book keeps the
+# TOP_K books with the highest counts (ties in catalogue order). A^T A is
+# computed a block of book rows at a time, as a sparse product (scipy.sparse
+# when installed, sorted pair counting with numpy otherwise), so the whole
+# co-occurrence matrix is never held in memory. Members who borrowed more
+# than MAX_MEMBER_BOOKS distinct books are left out of A: the pairs of a
+# member grow with the square of their books, so a few such accounts would
+# make up most of the work while saying little about what goes together.
+#
+# Like the other derived structures, the model is tied to the generation of
+# the transaction log. Issue rows appended since it was built are folded in
+# one at a time: an issue only raises counts, so the new book's row and the
+# lists of the borrower's other books can be updated exactly. A large batch
+# of appended rows, or any other change to the log, rebuilds it.
+TRANSACTIONS = 'transactions'
+TOP_K = 10
+MAX_MEMBER_BOOKS = 500
+# Appended log rows beyond which rebuilding is cheaper than folding them in
+INCREMENTAL_ROWS = 5000
+# Most (book, book) pairs counted at once while building
+BLOCK_PAIRS = 1_000_000
+
+_lock = threading.Lock()
+_model = {}
+
+
+def _incidence(log):
+    """(member codes, book codes) of the distinct member/book pairs of the Issue rows."""
+    issues = (log['Action'] == 'Issue').to_numpy()
+    books = log['BookID'].cat.codes.to_numpy()[issues].astype(np.int64)
+    members = log['MemberID'].cat.codes.to_numpy()[issues].astype(np.int64)
+    valid = (books >= 0) & (members >= 0)
+    n_books = len(log['BookID'].cat.categories)
+    keys = np.unique(members[valid] * n_books + books[valid])
+    return keys // n_books, keys % n_books
+
+
+def _grouped(rows, cols, n):
+    """(indptr, indices): the cols of each row, in order (CSR without values)."""
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32)
+
+
+def _block_counts(model, lo, hi):
+    """(rows, cols, counts) of rows lo..hi of A^T A without the diagonal, sorted by row then col."""
+    b_ptr, b_idx = model['by_book']
+    m_ptr, m_idx = model['by_member']
+    n_books = len(b_ptr) - 1
+    if sparse is not None:
+        block = (model['A_T'][lo:hi] @ model['A']).sorted_indices().tocoo()
+        rows, cols, counts = block.row.astype(np.int64) + lo, block.col.astype(np.int64), block.data
+    else:
+        # Every (book in the block, member, other book of that member) path
+        members = b_idx[b_ptr[lo]:b_ptr[hi]]
+        left = np.repeat(np.arange(lo, hi, dtype=np.int64), np.diff(b_ptr[lo:hi + 1]))
+        degree = np.diff(m_ptr)[members]
+        left = np.repeat(left, degree)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(degree) - degree, degree)
+        right = m_idx[np.repeat(m_ptr[members], degree) + offsets]
+        keys, counts = np.unique(left * n_books + right, return_counts=True)
+        rows, cols = keys // n_books, keys % n_books
+    keep = rows != cols
+    return rows[keep], cols[keep], counts[keep]
+
+
+def _top(rows, cols, counts, k):
+    """
+    (rows, ranks, cols, counts) of the k highest counts of every row, given
+    entries sorted by row then col (which breaks ties between equal counts).
+    """
+    if not len(rows):
+        return rows, rows, cols, counts
+    # One stable integer sort: by row, then by descending count
+    most = int(counts.max()) + 1
+    order = np.argsort((rows - rows[0]) * most + (most - 1 - counts), kind='stable')
+    rows, cols, counts = rows[order], cols[order], counts[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    keep = rank < k
+    return rows[keep], rank[keep], cols[keep], counts[keep]
+
+
+@metrics.timed('recommend.rebuild')
+def _build():
+    log, generation, _ = cache.peek_table(TRANSACTIONS)
+    book_ids = log['BookID'].cat.categories.tolist()
+    member_ids = log['MemberID'].cat.categories.tolist()
+    members, books = _incidence(log)
+    counted = (np.bincount(members, minlength=len(member_ids)) <= MAX_MEMBER_BOOKS)[members]
+    model = {
+        'generation': generation,
+        'length': len(log),
+        'book_ids': book_ids,
+        'book_code': {book_id: code for code, book_id in enumerate(book_ids)},
+        'member_ids': member_ids,
+        'member_code': {member_id: code for code, member_id in enumerate(member_ids)},
+        # Every member's books, but only the borrowers counted in A per book
+        'by_member': _grouped(members, books, len(member_ids)),
+        'by_book': _grouped(books[counted], members[counted], len(book_ids)),
+        # Pairs folded in since the build: book -> [member], member -> [book]
+        'new_borrowers': {},
+        'new_books': {},
+        'neighbors': np.full((len(book_ids), TOP_K), -1, dtype=np.int32),
+        'counts': np.zeros((len(book_ids), TOP_K), dtype=np.int32),
+    }
+    if sparse is not None:
+        b_ptr, b_idx = model['by_book']
+        model['A_T'] = sparse.csr_matrix(
+            (np.ones(len(b_idx), dtype=np.int32), b_idx, b_ptr), shape=(len(book_ids), len(member_ids)),
+        )
+        model['A'] = model['A_T'].T.tocsr()
+
+    # Blocks of consecutive books whose rows take about BLOCK_PAIRS paths each
+    b_ptr, b_idx = model['by_book']
+    degree = np.diff(model['by_member'][0])
+    paths = np.bincount(
+        np.repeat(np.arange(len(book_ids)), np.diff(b_ptr)), weights=degree[b_idx], minlength=len(book_ids),
+    )
+    total = np.cumsum(paths)
+    bounds = np.searchsorted(total, np.arange(BLOCK_PAIRS, total[-1] if len(total) else 0, BLOCK_PAIRS))
+    bounds = np.unique(np.r_[0, bounds + 1, len(book_ids)].clip(0, len(book_ids)))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        rows, rank, cols, counts = _top(*_block_counts(model, lo, hi), TOP_K)
+        model['neighbors'][rows, rank] = cols
+        model['counts'][rows, rank] = counts
+    model.pop('A', None)
+    model.pop('A_T', None)
+    return model
+
+
+# --- Incremental updates ---
+def _code(model, kind, key):
+    """The code of a book or member ID, adding IDs first seen in appended rows."""
+    codes = model[f'{kind}_code']
+    code = codes.get(key)
+    if code is None:
+        ids = model[f'{kind}_ids']
+        code = codes[key] = len(ids)
+        ids.append(key)
+        if kind == 'book' and code >= len(model['neighbors']):
+            grow = max(code + 1 - len(model['neighbors']), len(model['neighbors']) // 4, 16)
+            model['neighbors'] = np.vstack(
+                [model['neighbors'], np.full((grow, TOP_K), -1, dtype=np.int32)])
+            model['counts'] = np.vstack([model['counts'], np.zeros((grow, TOP_K), dtype=np.int32)])
+    return code
+
+
+def _linked(model, grouping, added, code):
+    """The members of a book (or the books of a member), sorted by build then by arrival."""
+    ptr, idx = model[grouping]
+    base = idx[ptr[code]:ptr[code + 1]] if code < len(ptr) - 1 else idx[:0]
+    extra = model[added].get(code)
+    return np.concatenate([base, np.array(extra, dtype=np.int32)]) if extra else base
+
+
+def _borrowers(model, book):
+    return _linked(model, 'by_book', 'new_borrowers', book)
+
+
+def _borrowed(model, member):
+    return _linked(model, 'by_member', 'new_books', member)
+
+
+def _set_top(model, book, pairs):
+    """Stores the TOP_K of (count, other book) pairs as the neighbours of `book`."""
+    pairs = sorted(pairs, key=lambda pair: (-pair[0], pair[1]))[:TOP_K]
+    model['neighbors'][book] = -1
+    model['counts'][book] = 0
+    for rank, (count, other) in enumerate(pairs):
+        model['neighbors'][book, rank] = other
+        model['counts'][book, rank] = count
+
+
+def _add_issue(model, member_id, book_id):
+    """Folds one issue into the model; returns False when it needs a rebuild instead."""
+    member, book = _code(model, 'member', member_id), _code(model, 'book', book_id)
+    others = _borrowed(model, member)
+    if (others == book).any():
+        return True  # borrowed before: A does not change
+    model['new_books'].setdefault(member, []).append(book)
+    if len(others) >= MAX_MEMBER_BOOKS:
+        # Already left out of A, or leaving it now (which lowers counts)
+        return len(others) > MAX_MEMBER_BOOKS
+    model['new_borrowers'].setdefault(book, []).append(member)
+
+    # The new book's row: recounted from its borrowers' books
+    borrowers = _borrowers(model, book)
+    paths = np.concatenate([_borrowed(model, m) for m in borrowers.tolist()])
+    cols, counts = np.unique(paths[paths != book], return_counts=True)
+    best = np.lexsort((cols, -counts))[:TOP_K]
+    _set_top(model, book, zip(counts[best].tolist(), cols[best].tolist()))
+
+    # Each other book of the borrower now shares one more member with it;
+    # by symmetry its new count is in the row just computed. Only lists the
+    # book now enters, or moves up in, have to change.
+    if not len(others):
+        return True
+    shared = counts[np.searchsorted(cols, others)]
+    neighbors, top_counts = model['neighbors'][others], model['counts'][others]
+    last, last_count = neighbors[:, -1], top_counts[:, -1]
+    changed = (
+        (neighbors == book).any(axis=1) | (last < 0) | (shared > last_count)
+        | ((shared == last_count) & (book < last))
+    )
+    for other, count in zip(others[changed].tolist(), shared[changed].tolist()):
+        current = [
+            (c, n) for n, c in zip(model['neighbors'][other].tolist(), model['counts'][other].tolist())
+            if n >= 0 and n != book
+        ]
+        _set_top(model, other, current + [(count, book)])
+    return True
+
+
+def _current():
+    """Returns the model, brought up to date with the transaction log."""
+    global _model
+    generation, length = cache.table_shape(TRANSACTIONS)
+    model = _model
+    if (not model or model['generation'] != generation or length < model['length']
+            or length - model['length'] > INCREMENTAL_ROWS):
+        model = _model = _build()
+    elif length > model['length']:
+        generation, length, rows = cache.read_tail(TRANSACTIONS, model['length'])
+        folded = generation == model['generation'] and all(
+            _add_issue(model, row['MemberID'], row['BookID'])
+            for row in rows
+            if row['Action'] == 'Issue' and isinstance(row['BookID'], str) and isinstance(row['MemberID'], str)
+        )
+        if folded:
+            model['length'] = length
+        else:
+            model = _model = _build()
+    return model
+
+
+def rebuild():
+    """Rebuilds the model from the whole log; returns the number of books with neighbours."""
+    global _model
+    with _lock:
+        _model = _build()
+        return int((_model['neighbors'][:, 0] >= 0).sum())
+
+
+def _describe(book_ids, values, column, limit):
+    """Book details for `book_ids` (best first), skipping books no longer in the catalogue."""
+    books = store.take('books', 'BookID', book_ids, ['Title', 'Author', 'Status'])
+    records = []
+    for book_id, value, (title, author, status) in zip(book_ids, values, books.itertuples(index=False)):
+        if not isinstance(title, str):
+            continue
+        records.append({'BookID': book_id, 'Title': title, 'Author': author,
+                        'Status': status, column: int(value)})
+        if len(records) == limit:
+            break
+    return records
+
+
+@metrics.timed('recommend.also_borrowed')
+def also_borrowed(book_id, limit=TOP_K):
+    """
+    Books most often borrowed by the members who borrowed `book_id`:
+    [{BookID, Title, Author, Status, Borrowers}], best first.
+    """
+    with _lock:
+        model = _current()
+        book = model['book_code'].get(book_id)
+        if book is None:
+            return []
+        neighbors = model['neighbors'][book].tolist()
+        counts = model['counts'][book].tolist()
+    pairs = [(code, n) for code, n in zip(neighbors, counts) if code >= 0]
+    ids = [model['book_ids'][code] for code, _ in pairs]
+    return _describe(ids, [n for _, n in pairs], 'Borrowers', limit)
+
+
+@metrics.timed('recommend.for_member')
+def for_member(member_id, limit=TOP_K):
+    """
+    Books a member has not borrowed, scored by how often they were borrowed
+    together with the member's books: [{BookID, Title, Author, Status, Score}].
+    """
+    with _lock:
+        model = _current()
+        member = model['member_code'].get(member_id)
+        if member is None:
+            return []
+        borrowed = _borrowed(model, member)
+        neighbors = model['neighbors'][borrowed].ravel()
+        counts = model['counts'][borrowed].ravel()
+        book_ids = model['book_ids']
+    keep = (neighbors >= 0) & ~np.isin(neighbors, borrowed)
+    codes, inverse = np.unique(neighbors[keep], return_inverse=True)
+    scores = np.bincount(inverse, weights=counts[keep], minlength=len(codes))
+    # Highest score first, ties in catalogue order; a few spare for deleted books
+    order = np.lexsort((codes, -scores))[:limit + TOP_K]
+    return _describe([book_ids[code] for code in codes[order]], scores[order], 'Score', limit)
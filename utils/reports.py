@@ -0,0 +1,175 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils import aggregates, cache, metrics, store
+from utils.data_manager import (
+    BOOKS, MEMBERS, TRANSACTIONS, active_loans_frame, days_since, loan_periods,
+)
+from utils.storage import DATE_FORMAT
+
+# Library-wide circulation reports: every active loan with its due date and
+# how overdue it is, an aging breakdown of the overdue ones, loan durations
+# per department and per role, and the most borrowed books. Everything is
+# computed column-wise over the active-loans table and the transaction log;
+# results are kept until one of the tables changes (or the day does).
+
+# Overdue loans by how many days past their due date they are
+AGING_BINS = [-np.inf, 0, 7, 30, 90, np.inf]
+AGING_LABELS = ['On time', '1-7 days', '8-30 days', '31-90 days', '90+ days']
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def _member_info(member_ids, columns):
+    """Member columns aligned with `member_ids`, looked up once per distinct member."""
+    codes, uniques = pd.factorize(pd.Series(member_ids, dtype=object))
+    # One extra all-NaN row, which code -1 (a missing ID) picks up
+    info = store.take(MEMBERS, 'MemberID', list(uniques), columns).reindex(range(len(uniques) + 1))
+    return info.iloc[codes].reset_index(drop=True)
+
+
+def _cached(name, tables, build):
+    key = tuple(cache.table_version(table) for table in tables) + (pd.Timestamp.now().date(),)
+    with _lock:
+        entry = _cache.get(name)
+        if entry is not None and entry['key'] == key:
+            return entry['data']
+    with metrics.timer(f'reports.{name}'):
+        data = build()
+    with _lock:
+        _cache[name] = {'key': key, 'data': data}
+    return data
+
+
+def _build_loans():
+    loans = active_loans_frame()
+    books = store.take(BOOKS, 'BookID', loans['BookID'], ['Title', 'Department'])
+    members = _member_info(loans['MemberID'], ['Name', 'Role', 'Department'])
+    period = loan_periods(members['Role'])
+    held = days_since(loans['Date'])
+    report = pd.DataFrame({
+        'BookID': loans['BookID'],
+        'Title': books['Title'],
+        'BookDepartment': books['Department'].astype(object),
+        'MemberID': loans['MemberID'],
+        'Name': members['Name'],
+        'Role': members['Role'].astype(object),
+        'Department': members['Department'].astype(object),
+        'IssueDate': loans['Date'],
+        'DueDate': loans['Date'] + pd.to_timedelta(period, unit='D'),
+        'LoanPeriod': period,
+        'DaysHeld': held,
+        'DaysOverdue': (held - period).clip(lower=0),
+    })
+    report['Overdue'] = report['DaysOverdue'] > 0
+    return report
+
+
+def active_loans():
+    """Every book on loan with its borrower, due date and days overdue (oldest first)."""
+    return _cached('loans', (TRANSACTIONS, BOOKS, MEMBERS), _build_loans)
+
+
+def overdue_loans():
+    """The active loans past their due date, most overdue first."""
+    loans = active_loans()
+    overdue = loans[loans['Overdue']]
+    return overdue.sort_values('DaysOverdue', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def aging_buckets():
+    """Number of active loans per AGING_LABELS bucket of days overdue."""
+    loans = active_loans()
+    buckets = pd.cut(loans['DaysOverdue'], bins=AGING_BINS, labels=AGING_LABELS)
+    counts = buckets.value_counts().reindex(AGING_LABELS, fill_value=0)
+    return counts.rename_axis('Aging').rename('Loans').astype('int64')
+
+
+def _build_completed_loans():
+    """
+    Pairs every Return with the Issue just before it (by Date) for the
+    same book: (MemberID, Role, Department, Days) per completed loan.
+    """
+    log, _, _ = cache.peek_table(TRANSACTIONS)
+    # Per book, by Date then log order, like the active-loans table and the
+    # repair (lexsort is stable: rows with the same date keep their sequence)
+    book = log['BookID'].cat.codes.to_numpy()
+    order = np.lexsort((log['Date'].to_numpy(), book))
+    book = book[order]
+    action = log['Action'].to_numpy(dtype=object)[order]
+    dates = log['Date'].to_numpy()[order]
+    returns = np.flatnonzero(
+        (action[1:] == 'Return') & (action[:-1] == 'Issue') & (book[1:] == book[:-1])
+    ) + 1
+    issues = returns - 1
+    members = log['MemberID'].to_numpy(dtype=object)[order[issues]]
+    info = _member_info(members, ['Role', 'Department'])
+    days = (dates[returns] - dates[issues]).astype('timedelta64[D]').astype('int64')
+    return pd.DataFrame({
+        'MemberID': members,
+        'Role': info['Role'].astype(object).fillna(''),
+        'Department': info['Department'].astype(object).fillna(''),
+        'Days': days,
+    })
+
+
+def completed_loans():
+    """Every returned loan with the borrower's role and department and its length in days."""
+    return _cached('completed', (TRANSACTIONS, MEMBERS), _build_completed_loans)
+
+
+def loan_durations(by):
+    """
+    Loan statistics per member 'Role' or 'Department': count and average,
+    median and longest duration of returned loans, plus the current number
+    of active and overdue loans.
+    """
+    completed = completed_loans()
+    stats = completed.groupby(by)['Days'].agg(['count', 'mean', 'median', 'max'])
+    stats.columns = ['Returned', 'AvgDays', 'MedianDays', 'MaxDays']
+    active = active_loans().assign(**{by: lambda df: df[by].fillna('')})
+    current = active.groupby(by).agg(Active=('BookID', 'size'), Overdue=('Overdue', 'sum'))
+    report = stats.join(current, how='outer')
+    report[['Returned', 'Active', 'Overdue']] = report[['Returned', 'Active', 'Overdue']].fillna(0).astype('int64')
+    report[['AvgDays', 'MedianDays']] = report[['AvgDays', 'MedianDays']].round(1)
+    return report.rename_axis(by)
+
+
+def top_borrowed(limit=10):
+    """The most issued books: BookID, Title and number of issues."""
+    top = aggregates.most_issued_books(limit)
+    ids = [book_id for book_id, _ in top]
+    titles = store.take(BOOKS, 'BookID', ids, ['Title'])['Title']
+    return pd.DataFrame({'BookID': ids, 'Title': titles, 'Issues': [n for _, n in top]})
+
+
+def summary():
+    """Headline numbers for the reports page."""
+    loans = active_loans()
+    overdue = loans[loans['Overdue']]
+    return {
+        'active': len(loans),
+        'overdue': len(overdue),
+        'overdue_share': round(100 * len(overdue) / len(loans), 1) if len(loans) else 0.0,
+        'max_days_overdue': int(overdue['DaysOverdue'].max()) if len(overdue) else 0,
+    }
+
+
+# Downloadable reports: name -> (function returning a DataFrame, keep index)
+REPORTS = {
+    'overdue': (overdue_loans, False),
+    'loans': (active_loans, False),
+    'aging': (aging_buckets, True),
+    'durations-by-department': (lambda: loan_durations('Department'), True),
+    'durations-by-role': (lambda: loan_durations('Role'), True),
+    'top-borrowed': (lambda: top_borrowed(100), False),
+}
+
+
+def to_csv(name):
+    """Renders one of REPORTS as CSV text."""
+    func, index = REPORTS[name]
+    return func().to_csv(index=index, date_format=DATE_FORMAT)
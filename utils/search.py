@@ -0,0 +1,283 @@
+import bisect
+import threading
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from utils import cache, metrics, storage, store
+
+# Trigram inverted index for the /books and /members search boxes.
+#
+# Every record gets a doc id (its order of arrival) and each lower-cased
+# trigram of its searchable fields maps to a compact array of doc ids. A
+# query intersects the postings of its own trigrams, then confirms the few
+# surviving candidates with a real substring test, so results match the old
+# `str.contains(..., case=False)` filter exactly while touching only
+# candidate rows. Appended records are indexed incrementally and deleted
+# ones are tombstoned; any other change to a table rebuilds its index.
+SEARCH_FIELDS = {
+    'books': [('BookID', 4), ('Title', 3), ('Author', 2), ('Department', 1)],
+    'members': [('MemberID', 4), ('Name', 3), ('Role', 1), ('Department', 1)],
+}
+
+# Autocomplete uses a second structure on the same records: two sorted
+# lists of (term, doc) pairs, one over IDs and one over every word-start
+# suffix of the title/name ("machine learning", "learning"), so a prefix
+# lookup is a bisect plus a walk over the matching range. It is built the
+# first time a table is queried for suggestions and then kept in step with
+# the trigram index.
+SUGGEST_FIELDS = {'books': 'Title', 'members': 'Name'}
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _normalize(values):
+    return ['' if pd.isna(value) else str(value).lower() for value in values]
+
+
+def _add_docs(state, keys, field_texts):
+    """
+    Indexes new records; field_texts holds one lower-cased list per field.
+    Trigrams are computed once per distinct field value (departments, roles
+    and authors repeat a lot), then each value's doc ids are added in bulk.
+    """
+    first_doc = len(state['keys'])
+    for doc, key in enumerate(keys, first_doc):
+        state['doc_of'][key] = doc
+    state['keys'].extend(keys)
+    state['texts'].extend(zip(*field_texts))
+
+    additions = {}
+    for texts in field_texts:
+        codes, values = pd.factorize(pd.Series(texts, dtype=object))
+        order = np.argsort(codes, kind='stable')
+        splits = np.cumsum(np.bincount(codes, minlength=len(values)))[:-1]
+        for value, docs in zip(values, np.split(order + first_doc, splits)):
+            for gram in _trigrams(value):
+                additions.setdefault(gram, []).append(docs)
+
+    if state.get('prefixes') is not None:
+        _add_prefixes(state, range(first_doc, len(state['keys'])))
+
+    postings = state['postings']
+    for gram, parts in additions.items():
+        docs = np.unique(np.concatenate(parts)).astype(np.int32)
+        posting = postings.get(gram)
+        if posting is None:
+            posting = postings[gram] = array('i')
+        posting.frombytes(docs.tobytes())
+
+
+def _prefix_terms(state, doc):
+    """Yields (list name, term) for a record: its ID and each word start of its title/name."""
+    texts = state['texts'][doc]
+    yield 'ids', texts[0]
+    text = texts[state['suggest_field']]
+    start = 0
+    while start < len(text):
+        yield 'words', text[start:]
+        start = text.find(' ', start) + 1
+        if start == 0:
+            break
+
+
+def _add_prefixes(state, docs):
+    prefixes = state['prefixes']
+    docs = list(docs)
+    # A handful of new records are inserted in place; larger batches are
+    # appended and the lists re-sorted once
+    if len(docs) <= 64:
+        for doc in docs:
+            for name, term in _prefix_terms(state, doc):
+                bisect.insort(prefixes[name], (term, doc))
+    else:
+        for doc in docs:
+            for name, term in _prefix_terms(state, doc):
+                prefixes[name].append((term, doc))
+        for terms in prefixes.values():
+            terms.sort()
+
+
+def _index_rows(state, table, df):
+    fields = [column for column, _ in SEARCH_FIELDS[table]]
+    key_column = storage.TABLE_KEYS[table]
+    _add_docs(state, df[key_column].tolist(), [_normalize(df[col].tolist()) for col in fields])
+
+
+@metrics.timed('search.rebuild')
+def _rebuild(table):
+    df, generation, _ = cache.peek_table(table)
+    state = {
+        'generation': generation,
+        'length': len(df),
+        'keys': [],
+        'texts': [],
+        'doc_of': {},
+        'postings': {},
+        'deleted': set(),
+        'prefixes': None,
+        'suggest_field': [col for col, _ in SEARCH_FIELDS[table]].index(SUGGEST_FIELDS[table]),
+    }
+    _index_rows(state, table, df)
+    return state
+
+
+def rebuild(table):
+    """Rebuilds the index of `table` from scratch; returns the number of records indexed."""
+    state = _rebuild(table)
+    with _lock:
+        _indexes[table] = state
+    return state['length']
+
+
+def _current_index(table):
+    """Returns the index for `table`, brought up to date with the cache."""
+    state = _indexes.get(table)
+    generation, length = cache.table_shape(table)
+    if state is not None and state['generation'] != generation:
+        removed = cache.deleted_since(table, state['generation'])
+        if removed is None:
+            state = None
+        else:
+            for key in removed:
+                doc = state['doc_of'].pop(key, None)
+                # Rows appended after the last query were never indexed
+                if doc is not None:
+                    state['deleted'].add(doc)
+                    state['length'] -= 1
+            state['generation'] = generation
+    if state is None or length < state['length']:
+        state = _indexes[table] = _rebuild(table)
+    elif length > state['length']:
+        generation, length, rows = cache.read_tail(table, state['length'])
+        if generation != state['generation']:
+            state = _indexes[table] = _rebuild(table)
+        else:
+            _index_rows(state, table, pd.DataFrame(rows))
+            state['length'] = length
+    return state
+
+
+def _score(texts, weights, query):
+    """Ranks one record: exact field match > prefix/word match > substring."""
+    best = 0
+    for text, weight in zip(texts, weights):
+        if query not in text:
+            continue
+        if text == query:
+            strength = 3
+        elif text.startswith(query) or (' ' + query) in text:
+            strength = 2
+        else:
+            strength = 1
+        best = max(best, strength * weight)
+    return best
+
+
+@metrics.timed('search.search')
+def search(table, query, limit=None):
+    """
+    Returns the keys of the records whose searchable fields contain `query`
+    (case-insensitive), best matches first, ties in table order.
+    """
+    query = query.strip().lower()
+    weights = [weight for _, weight in SEARCH_FIELDS[table]]
+    with _lock:
+        state = _current_index(table)
+        grams = _trigrams(query)
+        if grams:
+            candidates = None
+            for gram in sorted(grams, key=lambda g: len(state['postings'].get(g, ()))):
+                posting = state['postings'].get(gram)
+                if posting is None:
+                    return []
+                docs = np.frombuffer(posting, dtype=np.int32)
+                candidates = docs if candidates is None else np.intersect1d(
+                    candidates, docs, assume_unique=True
+                )
+                if candidates.size == 0:
+                    return []
+            candidates = candidates.tolist()
+        else:
+            # One- and two-letter queries have no trigrams: check every record
+            candidates = range(len(state['keys']))
+
+        scored = []
+        for doc in candidates:
+            if doc in state['deleted']:
+                continue
+            score = _score(state['texts'][doc], weights, query)
+            if score:
+                scored.append((-score, doc))
+        scored.sort()
+        if limit is not None:
+            scored = scored[:limit]
+        return [state['keys'][doc] for _, doc in scored]
+
+
+def _prefix_matches(state, prefix):
+    """
+    Yields the live docs with a term starting with `prefix`, ID matches
+    first; a key that occurs twice in the table is only yielded once.
+    """
+    if state['prefixes'] is None:
+        state['prefixes'] = {'ids': [], 'words': []}
+        _add_prefixes(state, range(len(state['keys'])))
+    seen = set()
+    for name in ('ids', 'words'):
+        terms = state['prefixes'][name]
+        i = bisect.bisect_left(terms, (prefix,))
+        while i < len(terms) and terms[i][0].startswith(prefix):
+            doc = terms[i][1]
+            i += 1
+            key = state['keys'][doc]
+            if key not in seen and doc not in state['deleted']:
+                seen.add(key)
+                yield doc
+
+
+@metrics.timed('search.suggest')
+def suggest(table, prefix, limit=10, **filters):
+    """
+    Returns up to `limit` records (as a DataFrame) whose ID, or a word of
+    whose title/name, starts with `prefix` (case-insensitive); ID matches
+    come first, then alphabetical (an empty prefix lists records in table
+    order). `filters` maps columns to the value the record must currently
+    hold, e.g. Status='Available'.
+    """
+    prefix = prefix.strip().lower()
+    key_column = storage.TABLE_KEYS[table]
+    if not prefix:
+        # Nothing typed yet: the first matching records in table order
+        df, _, _ = cache.peek_table(table)
+        mask = pd.Series(True, index=df.index)
+        for col, value in filters.items():
+            mask &= df[col] == value
+        return df[mask].head(limit * 4).drop_duplicates(key_column).head(limit).copy()
+    found = []
+    with _lock:
+        state = _current_index(table)
+        matches = _prefix_matches(state, prefix)
+        size = limit * 4
+        while True:
+            # Filters are checked against the live table in growing batches,
+            # since statuses change without touching the index
+            batch = [state['keys'][doc] for _, doc in zip(range(size), matches)]
+            if not batch:
+                break
+            size = min(size * 2, 65536)
+            rows = store.rows(table, key_column, batch)
+            for col, value in filters.items():
+                rows = rows[rows[col] == value]
+            found.append(rows)
+            if sum(len(part) for part in found) >= limit:
+                break
+    if not found:
+        return store.rows(table, key_column, [])
+    return pd.concat(found).head(limit)
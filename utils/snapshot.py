@@ -0,0 +1,231 @@
+"""
+Binary snapshots of the CSV tables, for fast worker start-up.
+
+Next to each data/<table>.csv the CSV backend keeps a typed, columnar copy
+(.<table>.snapshot.feather, or .pkl when pyarrow is not installed) plus a
+small JSON file describing the exact CSV bytes it was made from. Reading a
+table then costs a binary load instead of a CSV parse:
+
+    - CSV unchanged since the snapshot   -> load the snapshot
+    - CSV only appended to (same file,
+      same leading bytes)                -> load the snapshot, parse the tail
+    - anything else (rewritten, edited)  -> parse the CSV, write a new snapshot
+
+The CSV files stay the source of truth and can still be edited by hand.
+Set LIBRARY_SNAPSHOTS=0 to disable snapshots. Maintenance:
+
+    python -m utils.snapshot compact   # fold appended rows into fresh snapshots
+    python -m utils.snapshot status    # show which snapshots are fresh
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots are saved without the file lock
+    fcntl = None
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pandas' own pickle format keeps the dtypes just as well
+    feather = None
+
+import pandas as pd
+
+ENABLED = os.environ.get('LIBRARY_SNAPSHOTS', '1') != '0'
+FORMAT = 'feather' if feather is not None else 'pickle'
+
+# Re-snapshot on read once the appended tail is this large a share of the file
+REFRESH_RATIO = 0.25
+
+_save_lock = threading.Lock()
+
+
+def snapshot_path(csv_path):
+    csv_path = Path(csv_path)
+    suffix = 'feather' if FORMAT == 'feather' else 'pkl'
+    return csv_path.with_name(f'.{csv_path.stem}.snapshot.{suffix}')
+
+
+def meta_path(csv_path):
+    csv_path = Path(csv_path)
+    return csv_path.with_name(f'.{csv_path.stem}.snapshot.json')
+
+
+def file_state(path):
+    """Identity of a file's current contents: inode, size and mtime."""
+    stat = os.stat(path)
+    return {'inode': stat.st_ino, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _digest(path, size):
+    """sha1 of the first `size` bytes of a file."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        remaining = size
+        while remaining > 0:
+            block = f.read(min(remaining, 1 << 20))
+            if not block:
+                break
+            sha.update(block)
+            remaining -= len(block)
+    return sha.hexdigest()
+
+
+def _write_atomic(path, write):
+    """
+    Writes `path` through a temporary file and os.replace; returns the
+    file_state of the file written (os.replace keeps inode, size and mtime).
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f'{path.name}.', suffix='.tmp', dir=path.parent)
+    os.close(fd)
+    try:
+        write(tmp_path)
+        state = file_state(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return state
+
+
+@contextmanager
+def _saving(csv_path):
+    """Serializes snapshot writes of one CSV file across threads and processes."""
+    with _save_lock:
+        if fcntl is None:
+            yield
+            return
+        lock_path = csv_path.with_name(f'.{csv_path.stem}.snapshot.lock')
+        with open(lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_meta(csv_path):
+    try:
+        with open(meta_path(csv_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _dump(df, path):
+    if FORMAT == 'feather':
+        feather.write_feather(df, path)
+    else:
+        df.to_pickle(path)
+
+
+def save(csv_path, df, state):
+    """
+    Stores `df` as the snapshot of `csv_path`, whose contents were `state`
+    (from file_state) when `df` was read.
+    """
+    csv_path = Path(csv_path)
+    path = snapshot_path(csv_path)
+    with _saving(csv_path):
+        written = _write_atomic(path, lambda tmp: _dump(df, tmp))
+        # The state of the file written here, not of whatever is at `path`
+        # now: the metadata must never vouch for another writer's snapshot
+        meta = dict(state, sha1=_digest(csv_path, state['size']), format=FORMAT,
+                    snapshot=written, rows=len(df))
+        _write_atomic(meta_path(csv_path), lambda tmp: Path(tmp).write_text(json.dumps(meta)))
+
+
+def load(csv_path):
+    """
+    Returns (df, offset) when a usable snapshot exists: `df` holds the rows
+    of the first `offset` bytes of the CSV, which the caller completes by
+    parsing the rest. Returns None when the CSV has to be parsed in full.
+    """
+    csv_path = Path(csv_path)
+    meta = _read_meta(csv_path)
+    path = snapshot_path(csv_path)
+    if meta is None or meta.get('format') != FORMAT or not path.exists():
+        return None
+    # The data file must be the one the metadata was written for
+    if file_state(path) != meta['snapshot']:
+        return None
+
+    state = file_state(csv_path)
+    unchanged = all(state[k] == meta[k] for k in ('inode', 'size', 'mtime_ns'))
+    if not unchanged:
+        # Appends keep the file (inode) and its leading bytes; rewrites
+        # through os.replace or an editor change one or the other
+        if state['inode'] != meta['inode'] or state['size'] < meta['size']:
+            return None
+        if _digest(csv_path, meta['size']) != meta['sha1']:
+            return None
+
+    if FORMAT == 'feather':
+        df = feather.read_table(path, memory_map=True).to_pandas()
+    else:
+        df = pd.read_pickle(path)
+    return df, meta['size']
+
+
+def needs_refresh(offset, state):
+    """True when the tail parsed after a snapshot has grown large."""
+    return state['size'] - offset > REFRESH_RATIO * max(offset, 1)
+
+
+def status(csv_path):
+    """Describes the snapshot of one CSV file for the CLI."""
+    csv_path = Path(csv_path)
+    meta = _read_meta(csv_path)
+    if meta is None or not snapshot_path(csv_path).exists():
+        return 'no snapshot'
+    state = file_state(csv_path)
+    if all(state[k] == meta[k] for k in ('inode', 'size', 'mtime_ns')):
+        return f"fresh ({meta['rows']} rows, {meta['format']})"
+    if state['inode'] == meta['inode'] and state['size'] >= meta['size']:
+        return f"{state['size'] - meta['size']} bytes appended since the snapshot"
+    return 'stale (file rewritten)'
+
+
+def compact(backend, table):
+    """
+    Rewrites the snapshot of one table of a CsvStorage `backend` so it
+    covers the whole CSV file; returns the table's row count.
+    """
+    path = backend.path(table)
+    with backend.lock.hold():
+        state = file_state(path)
+        df = backend.read(table)
+        save(path, df, state)
+    return len(df)
+
+
+def main(argv=None):
+    from utils import storage
+
+    parser = argparse.ArgumentParser(description="Manage the binary snapshots of the CSV tables.")
+    parser.add_argument('command', choices=['compact', 'status'],
+                        help="compact: rewrite every snapshot to cover the whole CSV, "
+                             "status: report how fresh each snapshot is")
+    parser.add_argument('--data-dir', default=storage.DATA_DIR, help="directory holding the CSV files")
+    args = parser.parse_args(argv)
+
+    backend = storage.CsvStorage(args.data_dir, snapshots=True)
+    for table in storage.TABLES:
+        path = backend.path(table)
+        if args.command == 'compact':
+            rows = compact(backend, table)
+            print(f"-> {table}: {rows} rows -> {snapshot_path(path).name}")
+        else:
+            print(f"-> {table}: {status(path)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,543 @@
+"""
+Storage backends for the library tables.
+
+The rest of the app never touches files directly: utils.cache reads tables
+and applies writes through the active backend. Two backends exist:
+
+    CsvStorage     the original data/*.csv files (default)
+    SqliteStorage  a single SQLite database in WAL mode, with indexes and
+                   single-row, transactional writes
+
+Select one with the LIBRARY_STORAGE environment variable ('csv' or
+'sqlite'); LIBRARY_DB overrides the database path. Move data between the two
+with:
+
+    python -m utils.storage import   # data/*.csv -> data/library.db
+    python -m utils.storage export   # data/library.db -> data/*.csv
+    python -m utils.storage memory   # in-memory size of each table
+"""
+import argparse
+import csv
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
+
+import pandas as pd
+
+from utils import metrics, snapshot
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / 'data'
+DB_FILE = Path(os.environ.get('LIBRARY_DB', DATA_DIR / 'library.db'))
+
+BOOK_COLUMNS = ['BookID', 'Title', 'Author', 'Department', 'Status']
+MEMBER_COLUMNS = ['MemberID', 'Name', 'Role', 'Department', 'Batch']
+TRANSACTION_COLUMNS = ['TransactionID', 'BookID', 'MemberID', 'Date', 'Action']
+
+TABLES = {
+    'books': BOOK_COLUMNS,
+    'members': MEMBER_COLUMNS,
+    'transactions': TRANSACTION_COLUMNS,
+}
+TABLE_KEYS = {
+    'books': 'BookID',
+    'members': 'MemberID',
+    'transactions': 'TransactionID',
+}
+
+# Column types every backend loads the tables with. Columns that repeat a
+# handful of values (statuses, departments, and the book/member references
+# in the log) are categoricals, keys are strings and dates are datetimes;
+# left to read_csv inference they would all be Python string objects.
+DATE_FORMAT = '%Y-%m-%d'
+SCHEMAS = {
+    'books': {
+        'BookID': 'str', 'Title': 'str', 'Author': 'str',
+        'Department': 'category', 'Status': 'category',
+    },
+    'members': {
+        'MemberID': 'str', 'Name': 'str', 'Role': 'category',
+        'Department': 'category', 'Batch': 'str',
+    },
+    'transactions': {
+        'TransactionID': 'str', 'BookID': 'category', 'MemberID': 'category',
+        'Date': 'datetime', 'Action': 'category',
+    },
+}
+
+
+class ConflictError(Exception):
+    """A conditional update found the row in an unexpected state."""
+
+
+def apply_schema(table, df):
+    """Returns `df` with the columns of `table` converted to their SCHEMAS types."""
+    columns = {}
+    for col, kind in SCHEMAS[table].items():
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if kind == 'datetime':
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                columns[col] = pd.to_datetime(values, format=DATE_FORMAT)
+        elif kind == 'category':
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                columns[col] = values.astype('category')
+        elif values.dtype != kind:
+            columns[col] = values.astype(kind)
+    return df.assign(**columns) if columns else df
+
+
+def concat_rows(table, df, rows):
+    """
+    Appends `rows` (dicts) to a typed table. New categorical values are
+    added to the existing categories, so the result keeps its compact types
+    (plain pd.concat would fall back to object columns).
+    """
+    appended = apply_schema(table, pd.DataFrame(rows, columns=df.columns))
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            new = appended[col].cat.categories.difference(df[col].cat.categories)
+            if len(new):
+                df = df.assign(**{col: df[col].cat.add_categories(new)})
+            appended[col] = appended[col].astype(df[col].dtype)
+    return pd.concat([df, appended], ignore_index=True)
+
+
+def set_value(df, position, col, value):
+    """Sets one cell in place, extending a categorical column if needed."""
+    column = df[col]
+    if isinstance(column.dtype, pd.CategoricalDtype) and not pd.isna(value) \
+            and value not in column.cat.categories:
+        df[col] = column.cat.add_categories([value])
+    df.iat[position, df.columns.get_loc(col)] = value
+
+
+def memory_usage(df):
+    """Bytes held by each column of `df`, strings included."""
+    return df.memory_usage(index=False, deep=True).to_dict()
+
+
+# Write operations understood by every backend's apply():
+#   ('append',  table, rows)                     rows: list of dicts
+#   ('update',  table, key, changes, expected)   set `changes` on the row whose
+#                                                key column equals `key`, only if
+#                                                it currently matches `expected`
+#   ('delete',  table, key)
+#   ('replace', table, df)                       rewrite the whole table
+# Backends with row_writes = False only receive 'append' and 'replace'; the
+# cache turns updates and deletes into a rewrite of the full table for them.
+
+
+class WriteLock:
+    """
+    Exclusive lock serializing writers across threads and processes
+    (flock on `path`). Re-entrant within a thread, so a write path can call
+    other write paths while holding it.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._thread_lock = threading.RLock()
+        self._local = threading.local()
+
+    @contextmanager
+    def hold(self):
+        with self._thread_lock:
+            depth = getattr(self._local, 'depth', 0)
+            if depth == 0 and fcntl is not None:
+                self._local.file = open(self.path, 'a')
+                fcntl.flock(self._local.file, fcntl.LOCK_EX)
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+                if depth == 0 and fcntl is not None:
+                    fcntl.flock(self._local.file, fcntl.LOCK_UN)
+                    self._local.file.close()
+
+
+def _needs_newline(path):
+    """True if the file has content that does not end with a line break."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b'\n'
+
+
+class CsvStorage:
+    """One CSV file per table in `data_dir`."""
+
+    name = 'csv'
+    row_writes = False
+
+    def __init__(self, data_dir=DATA_DIR, snapshots=None):
+        self.data_dir = Path(data_dir)
+        self.lock = WriteLock(self.data_dir / '.write.lock')
+        # Load tables from binary snapshots when fresh (see utils/snapshot.py)
+        self.snapshots = snapshot.ENABLED if snapshots is None else snapshots
+
+    def path(self, table):
+        return self.data_dir / f'{table}.csv'
+
+    def signature(self, table):
+        """(mtime_ns, size) of the file; changes whenever the file does."""
+        stat = os.stat(self.path(table))
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def last_modified(self, table):
+        return os.stat(self.path(table)).st_mtime
+
+    def read(self, table):
+        path = self.path(table)
+        if not self.snapshots:
+            return self._parse(table, path)
+
+        state = snapshot.file_state(path)
+        with metrics.timer('storage.snapshot_load'):
+            loaded = snapshot.load(path)
+        if loaded is not None:
+            df, offset = loaded
+            if offset == state['size']:
+                return df
+            # Only rows were appended: parse just the new bytes
+            df = concat_rows(table, df, self._parse(table, path, offset, list(df.columns)))
+            if not snapshot.needs_refresh(offset, state):
+                return df
+        else:
+            df = self._parse(table, path)
+        # Snapshot what was parsed, unless the file changed in the meantime
+        if snapshot.file_state(path) == state:
+            try:
+                snapshot.save(path, df, state)
+            except OSError:
+                pass  # e.g. a read-only data directory: keep parsing the CSV
+        return df
+
+    @metrics.timed('storage.csv_parse')
+    def _parse(self, table, path, offset=0, names=None):
+        """Parses the CSV (from byte `offset`, header-less, when given) with the table schema."""
+        dtype = {col: 'str' for col, kind in SCHEMAS[table].items() if kind != 'datetime'}
+        if offset:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+            if not data.strip():
+                return pd.DataFrame(columns=names)
+            df = pd.read_csv(io.BytesIO(data), header=None, names=names, dtype=dtype)
+        else:
+            df = pd.read_csv(path, dtype=dtype)
+        return apply_schema(table, df)
+
+    def apply(self, ops):
+        for op in ops:
+            if op[0] == 'append':
+                self._append(op[1], op[2])
+            elif op[0] == 'replace':
+                self._replace(op[1], op[2])
+            else:
+                raise ValueError(f"CSV storage cannot apply {op[0]!r} in place")
+
+    def _replace(self, table, df):
+        """
+        Rewrites a table atomically: the new contents go to a temp file in
+        the same directory, which then replaces the old file in one step.
+        A crash mid-write leaves the previous file intact.
+        """
+        path = self.path(table)
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{table}.', suffix='.tmp', dir=self.data_dir)
+        try:
+            with os.fdopen(fd, 'w', newline='') as f:
+                with metrics.timer('storage.csv_write'):
+                    df.to_csv(f, index=False, date_format=DATE_FORMAT)
+                f.flush()
+                os.fsync(f.fileno())
+                metrics.inc('library_bytes_written_total', f.tell(), table=table)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _append(self, table, rows):
+        """
+        Appends rows without rewriting the file. The file is fsync'd so an
+        acknowledged write survives a crash.
+        """
+        path = self.path(table)
+        columns = TABLES[table]
+        write_header = os.path.getsize(path) == 0
+        needs_newline = not write_header and _needs_newline(path)
+
+        with open(path, 'a', newline='') as f:
+            start = f.tell()
+            if needs_newline:
+                f.write('\n')
+            writer = csv.writer(f, lineterminator='\n')
+            if write_header:
+                writer.writerow(columns)
+            writer.writerows([_text_value(row[col]) for col in columns] for row in rows)
+            f.flush()
+            os.fsync(f.fileno())
+            metrics.inc('library_bytes_written_total', f.tell() - start, table=table)
+
+
+def _text_value(value):
+    """Formats dates the way the tables store them; other values pass through."""
+    if isinstance(value, pd.Timestamp):
+        return value.strftime(DATE_FORMAT)
+    return value
+
+
+def _sql_value(value):
+    """Converts pandas/numpy scalars to values sqlite3 can bind."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    value = _text_value(value)
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _quote(name):
+    return '"{}"'.format(name)
+
+
+class SqliteStorage:
+    """All tables in one SQLite database (WAL mode, indexed, transactional)."""
+
+    name = 'sqlite'
+    row_writes = True
+
+    INDEXES = [
+        ('books', 'BookID', True),
+        ('members', 'MemberID', True),
+        ('transactions', 'TransactionID', False),
+        ('transactions', 'BookID', False),
+        ('transactions', 'MemberID', False),
+        ('transactions', 'Date', False),
+    ]
+
+    def __init__(self, db_file=DB_FILE):
+        self.db_file = Path(db_file)
+        self.lock = WriteLock(f'{self.db_file}.lock')
+        self._local = threading.local()
+        self.create_schema()
+
+    def connection(self):
+        """One connection per thread; autocommit with explicit transactions."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, isolation_level=None, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def create_schema(self):
+        conn = self.connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS table_versions '
+            '(name TEXT PRIMARY KEY, version INTEGER NOT NULL)'
+        )
+        for table, columns in TABLES.items():
+            conn.execute('CREATE TABLE IF NOT EXISTS {} ({})'.format(
+                table, ', '.join(f'{_quote(col)} TEXT' for col in columns)
+            ))
+            conn.execute(
+                'INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)', (table,)
+            )
+            # Every change to a table bumps its version, including writes made
+            # by other processes or by hand, so caches can cheaply detect them
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version '
+                    f'AFTER {event} ON {table} BEGIN '
+                    f"UPDATE table_versions SET version = version + 1 WHERE name = '{table}'; "
+                    'END'
+                )
+        for table, column, unique in self.INDEXES:
+            conn.execute('CREATE {}INDEX IF NOT EXISTS idx_{}_{} ON {} ({})'.format(
+                'UNIQUE ' if unique else '', table, column.lower(), table, _quote(column)
+            ))
+
+    def signature(self, table):
+        row = self.connection().execute(
+            'SELECT version FROM table_versions WHERE name = ?', (table,)
+        ).fetchone()
+        return (row[0],)
+
+    def last_modified(self, table):
+        wal = Path(f'{self.db_file}-wal')
+        paths = [self.db_file] + ([wal] if wal.exists() else [])
+        return max(os.stat(path).st_mtime for path in paths)
+
+    @metrics.timed('storage.sqlite_read')
+    def read(self, table):
+        columns = ', '.join(_quote(col) for col in TABLES[table])
+        df = pd.read_sql_query(
+            f'SELECT {columns} FROM {table} ORDER BY rowid', self.connection()
+        )
+        return apply_schema(table, df)
+
+    @metrics.timed('storage.sqlite_write')
+    def apply(self, ops):
+        """Applies all operations in a single transaction."""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for op in ops:
+                getattr(self, '_' + op[0])(conn, *op[1:])
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _insert(self, conn, table, rows):
+        columns = TABLES[table]
+        conn.executemany(
+            'INSERT INTO {} ({}) VALUES ({})'.format(
+                table, ', '.join(_quote(col) for col in columns), ', '.join('?' * len(columns))
+            ),
+            ([_sql_value(row[col]) for col in columns] for row in rows),
+        )
+
+    def _append(self, conn, table, rows):
+        self._insert(conn, table, rows)
+
+    def _update(self, conn, table, key, changes, expected):
+        assignments = ', '.join(f'{_quote(col)} = ?' for col in changes)
+        conditions = ''.join(f' AND {_quote(col)} = ?' for col in expected)
+        cursor = conn.execute(
+            f'UPDATE {table} SET {assignments} WHERE {_quote(TABLE_KEYS[table])} = ?{conditions}',
+            [_sql_value(v) for v in changes.values()] + [key]
+            + [_sql_value(v) for v in expected.values()],
+        )
+        if cursor.rowcount == 0:
+            raise ConflictError(f"{table} row {key} changed concurrently.")
+
+    def _delete(self, conn, table, key):
+        conn.execute(f'DELETE FROM {table} WHERE {_quote(TABLE_KEYS[table])} = ?', (key,))
+
+    def _replace(self, conn, table, df):
+        conn.execute(f'DELETE FROM {table}')
+        self._insert(conn, table, df.to_dict('records'))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def make_backend(kind=None):
+    """Builds the backend named by `kind` (default: $LIBRARY_STORAGE or 'csv')."""
+    kind = kind or os.environ.get('LIBRARY_STORAGE', 'csv')
+    if kind == 'csv':
+        return CsvStorage()
+    if kind == 'sqlite':
+        return SqliteStorage()
+    raise ValueError(f"Unknown storage backend {kind!r} (expected 'csv' or 'sqlite')")
+
+
+def get_backend():
+    """Returns the process-wide storage backend."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = make_backend()
+    return _backend
+
+
+def write_lock():
+    """
+    Context manager held around every read-validate-write sequence, so
+    concurrent workers (threads or processes) never act on stale reads.
+    """
+    return get_backend().lock.hold()
+
+
+def set_backend(backend):
+    """Swaps the process-wide backend (cached tables must be invalidated)."""
+    global _backend
+    _backend = backend
+
+
+def import_csv(data_dir=DATA_DIR, db_file=DB_FILE):
+    """One-shot copy of every CSV table into the SQLite database."""
+    source, target = CsvStorage(data_dir, snapshots=False), SqliteStorage(db_file)
+    counts = {}
+    for table, columns in TABLES.items():
+        # Read as text so IDs and batches round-trip exactly
+        df = pd.read_csv(source.path(table), dtype=str, keep_default_na=False)[columns]
+        if table != 'transactions':
+            # Lookups always used the first row of a duplicated ID
+            df = df.drop_duplicates(subset=TABLE_KEYS[table], keep='first')
+        target.apply([('replace', table, df)])
+        counts[table] = len(df)
+    return counts
+
+
+def export_csv(data_dir=DATA_DIR, db_file=DB_FILE):
+    """One-shot dump of every SQLite table back to CSV files."""
+    source, target = SqliteStorage(db_file), CsvStorage(data_dir)
+    counts = {}
+    for table in TABLES:
+        df = source.read(table)
+        target.apply([('replace', table, df)])
+        counts[table] = len(df)
+    return counts
+
+
+def memory_report(backend=None):
+    """
+    Returns {table: (rows, bytes as loaded, bytes as untyped text columns)},
+    i.e. the footprint of each table with and without SCHEMAS.
+    """
+    backend = backend or get_backend()
+    report = {}
+    for table in TABLES:
+        df = backend.read(table)
+        text = df.astype(object)
+        for col, kind in SCHEMAS[table].items():
+            if kind == 'datetime':
+                text[col] = df[col].dt.strftime(DATE_FORMAT).astype(object)
+        report[table] = (
+            len(df), sum(memory_usage(df).values()), sum(memory_usage(text).values()),
+        )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move library data between CSV files and SQLite.")
+    parser.add_argument('command', choices=['import', 'export', 'memory'],
+                        help="import: CSV -> SQLite, export: SQLite -> CSV, "
+                             "memory: report the in-memory size of each table")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="directory holding the CSV files")
+    parser.add_argument('--db', default=DB_FILE, help="SQLite database file")
+    args = parser.parse_args(argv)
+
+    if args.command == 'memory':
+        for table, (rows, typed, text) in memory_report().items():
+            print(f"-> {table}: {rows} rows, {typed / 2**20:.1f} MiB "
+                  f"({text / 2**20:.1f} MiB as untyped text, {text / max(typed, 1):.1f}x)")
+        return
+    if args.command == 'import':
+        counts = import_csv(args.data_dir, args.db)
+    else:
+        counts = export_csv(args.data_dir, args.db)
+    for table, count in counts.items():
+        print(f"-> {table}: {count} rows")
+
+
+if __name__ == '__main__':
+    main()
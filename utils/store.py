@@ -0,0 +1,105 @@
+import threading
+
+from utils import cache
+
+# Hash indexes over the cached tables, keyed by (table, column, kind).
+# An index is tied to the table generation it was built for; while the
+# generation holds, rows appended since the last lookup are indexed
+# incrementally, so keeping an index current costs O(new rows).
+_lock = threading.RLock()
+_indexes = {}
+
+
+def _extend(state, values, start, unique):
+    index = state['index']
+    for pos, value in enumerate(values, start):
+        if unique:
+            index.setdefault(value, pos)
+        else:
+            index.setdefault(value, []).append(pos)
+
+
+def _index(table, column, unique):
+    """Returns (df, index) with the index brought up to date with the table."""
+    key = (table, column, unique)
+    with _lock:
+        df, generation, _ = cache.peek_table(table)
+        state = _indexes.get(key)
+        if state is None or state['generation'] != generation or state['length'] > len(df):
+            state = {'generation': generation, 'length': 0, 'index': {}}
+            _indexes[key] = state
+        if state['length'] < len(df):
+            values = df[column].iloc[state['length']:].tolist()
+            _extend(state, values, state['length'], unique)
+            state['length'] = len(df)
+        return df, state['index']
+
+
+def rebuild():
+    """Rebuilds every index built so far from its table; returns how many there are."""
+    with _lock:
+        keys = list(_indexes)
+        _indexes.clear()
+        for table, column, unique in keys:
+            _index(table, column, unique)
+    return len(keys)
+
+
+def position(table, column, key):
+    """Returns the row position of `key` in a unique column, or None."""
+    _, index = _index(table, column, unique=True)
+    return index.get(key)
+
+
+def lookup(table, column, key):
+    """Returns the row with `key` in a unique column as a dict, or None."""
+    df, index = _index(table, column, unique=True)
+    pos = index.get(key)
+    if pos is None:
+        return None
+    return df.iloc[pos].to_dict()
+
+
+def positions(table, column, key):
+    """Returns the row positions where a (non-unique) column equals `key`."""
+    _, index = _index(table, column, unique=False)
+    return list(index.get(key, []))
+
+
+def select(table, column, key):
+    """Returns a copy of the rows where a (non-unique) column equals `key`."""
+    df, index = _index(table, column, unique=False)
+    return df.iloc[index.get(key, [])].copy()
+
+
+def take(table, column, keys, columns):
+    """
+    Looks up each of `keys` in a unique column and returns the requested
+    `columns` as a DataFrame aligned with `keys` (NaN where a key is missing).
+    A hash-join alternative to pd.merge for a handful of keys.
+    """
+    df, index = _index(table, column, unique=True)
+    found = [index.get(key) for key in keys]
+    hits = [i for i, pos in enumerate(found) if pos is not None]
+    result = df[columns].iloc[[found[i] for i in hits]]
+    result.index = hits
+    return result.reindex(range(len(found)))
+
+
+def locate(table, column, keys):
+    """
+    Returns (df, positions): the row positions of `keys` in a unique column,
+    in the order given, and the table snapshot they refer to. Keys that are
+    not in the table are skipped. `df` is shared and must not be modified.
+    """
+    df, index = _index(table, column, unique=True)
+    return df, [index[key] for key in keys if key in index]
+
+
+def rows(table, column, keys):
+    """
+    Returns a copy of the rows for `keys` in a unique column, in the order
+    given; keys that are not in the table are skipped.
+    """
+    df, found = locate(table, column, keys)
+    return df.iloc[found].copy()
@@ -1,38 +1,116 @@
 import pandas as pd
-import os
-from datetime import datetime
-from pathlib import Path
+import argparse
 
-BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = BASE_DIR / 'data'
-BOOKS_FILE = DATA_DIR / 'books.csv'
-TRANSACTIONS_FILE = DATA_DIR / 'transactions.csv'
+from utils import cache, storage
 
-def repair_data():
+def _last_rows(transactions):
+    """Keeps the most recent transaction per book (by Date, then log order)."""
+    return (
+        transactions.sort_values(by='Date', kind='stable')
+        .drop_duplicates(subset='BookID', keep='last')
+    )
+
+def last_actions(transactions):
+    """Returns the last Action of every book as a Series indexed by BookID."""
+    last = _last_rows(transactions[['BookID', 'Date', 'Action']])
+    return last.set_index('BookID')['Action']
+
+def last_actions_chunked(path, chunksize):
+    """
+    Same as last_actions, but streams the CSV in chunks so the transaction
+    log never has to fit in memory. Only one row per book is kept between
+    chunks; earlier chunks come first, so ties on Date still favour the
+    later row in the log.
+    """
+    # IDs read as text, like the typed tables (1001 must not become an int)
+    dtype = {'BookID': str, 'Action': str}
+    last = None
+    for chunk in pd.read_csv(path, usecols=['BookID', 'Date', 'Action'], dtype=dtype,
+                             chunksize=chunksize):
+        chunk_last = _last_rows(chunk)
+        last = chunk_last if last is None else _last_rows(pd.concat([last, chunk_last]))
+    if last is None:
+        return pd.Series(dtype=object, name='Action')
+    return last.set_index('BookID')['Action']
+
+def plan_repair(books, actions):
+    """
+    Computes the status every book should have from its last action.
+    Returns (repaired books DF, DF of the rows whose Status changes).
+    """
+    expected = (
+        # Plain objects: a categorical Action (e.g. only Issues so far) cannot
+        # take the 'Available' fill
+        books['BookID'].map(actions).astype(object)
+        .map({'Issue': 'Issued'})
+        .fillna('Available')  # Returned, or no history at all
+    )
+    changed = books['Status'] != expected
+    diff = pd.DataFrame({
+        'BookID': books.loc[changed, 'BookID'],
+        'Old': books.loc[changed, 'Status'],
+        'New': expected[changed],
+    })
+
+    repaired = books.copy()
+    repaired['Status'] = expected
+    return repaired, diff
+
+def status_updates(diff):
+    """Conditional cache.commit updates applying a plan_repair diff."""
+    return [
+        ('update', 'books', position, {'Status': new}, {'Status': old})
+        for position, old, new in zip(diff.index, diff['Old'], diff['New'])
+    ]
+
+def repair_data(dry_run=False, chunksize=None):
+    """
+    Syncs every book's Status with the transaction log of the current
+    storage backend. The plan and the write happen under the write lock, so
+    a running server's issues and returns are never lost.
+    """
     print("Repairing data integrity...")
-    books = pd.read_csv(BOOKS_FILE)
-    transactions = pd.read_csv(TRANSACTIONS_FILE)
-    
-    # 2. Sync Book Status based on Last Transaction
-    for idx, row in books.iterrows():
-        bid = row['BookID']
-        # Find last transaction for this book
-        book_txs = transactions[transactions['BookID'] == bid].sort_values(by='Date')
-        
-        if not book_txs.empty:
-            last_action = book_txs.iloc[-1]['Action']
-            if last_action == 'Issue':
-                books.at[idx, 'Status'] = 'Issued'
-            else:
-                books.at[idx, 'Status'] = 'Available'
+    backend = storage.get_backend()
+    with storage.write_lock():
+        books, _, _ = cache.peek_table('books')
+
+        # 2. Sync Book Status based on Last Transaction (one pass over the log)
+        if chunksize and isinstance(backend, storage.CsvStorage):
+            actions = last_actions_chunked(backend.path('transactions'), chunksize)
         else:
-            # No history, default to Available
-            books.at[idx, 'Status'] = 'Available'
-            
-    # Save
-    books.to_csv(BOOKS_FILE, index=False)
-    transactions.to_csv(TRANSACTIONS_FILE, index=False)
-    print("-> Data Synced Successfully!")
+            log, _, _ = cache.peek_table('transactions')
+            actions = last_actions(log)
+        _, diff = plan_repair(books.assign(Status=books['Status'].astype(object)), actions)
+
+        # Save
+        if not dry_run and not diff.empty:
+            cache.commit(status_updates(diff))
+
+    if diff.empty:
+        print("-> All book statuses already match the transaction log.")
+    else:
+        print(f"-> {len(diff)} book status(es) out of sync:")
+        for row in diff.itertuples(index=False):
+            print(f"   {row.BookID}: {row.Old} -> {row.New}")
+
+    if dry_run:
+        print("-> Dry run, nothing written.")
+    else:
+        print("-> Data Synced Successfully!")
+    return diff
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync book statuses with the transaction log.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="only report the statuses that would change")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="stream transactions.csv in chunks of this many rows (CSV storage)")
+    parser.add_argument('--data-dir', default=None,
+                        help="directory holding the CSV files (default: the configured backend)")
+    args = parser.parse_args(argv)
+    if args.data_dir is not None:
+        storage.set_backend(storage.CsvStorage(args.data_dir))
+    repair_data(dry_run=args.dry_run, chunksize=args.chunksize)
 
 if __name__ == "__main__":
-    repair_data()
+    main()
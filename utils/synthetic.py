@@ -0,0 +1,209 @@
+"""
+Seeded synthetic library data, for benchmarks and load tests.
+
+Writes books.csv, members.csv and transactions.csv in the same layout as
+data/. Borrowing is skewed the way real circulation is: book popularity and
+member activity follow power laws, so a few titles and members account for
+most loans. Each book's loans follow one another without overlap, most are
+returned after about two weeks, a tail runs late, and the latest loan of a
+book may still be open (the book is then Issued). The same seed always
+produces the same files.
+
+    python -m utils.synthetic --rows 1000000 --out /tmp/library-1m
+"""
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.storage import BOOK_COLUMNS, MEMBER_COLUMNS, TRANSACTION_COLUMNS, DATE_FORMAT
+
+DEPARTMENTS = ['Computer Engineering', 'Information Technology', 'Mechanical Engineering',
+               'Civil Engineering', 'Electronics', 'MBA']
+ROLES = ['Student', 'Faculty', 'Research Scholar']
+ROLE_SHARES = [0.85, 0.1, 0.05]
+
+SUBJECTS = ['Algorithms', 'Operating Systems', 'Networks', 'Databases', 'Machine Learning',
+            'Thermodynamics', 'Fluid Mechanics', 'Structural Analysis', 'Signals', 'Circuits',
+            'Marketing', 'Finance', 'Compilers', 'Graphics', 'Statistics', 'Robotics']
+PREFIXES = ['Introduction to', 'Advanced', 'Principles of', 'Applied', 'Modern', 'Foundations of',
+            'Handbook of', 'Topics in']
+FIRST_NAMES = ['Rahul', 'Priya', 'Amit', 'Sneha', 'Arvind', 'Neha', 'Shubham', 'Kavya', 'Rohan',
+               'Ananya', 'Vikram', 'Isha', 'Thomas', 'Maria', 'David', 'Sara']
+LAST_NAMES = ['Patil', 'Sharma', 'Reddy', 'Verma', 'Iyer', 'Kulkarni', 'Gupta', 'Nair', 'Das',
+              'Joshi', 'Cormen', 'Knuth', 'Russell', 'Martin', 'Korth', 'Mitchell']
+
+# Popularity exponents: weight of the k-th most popular book / member is k ** -s
+BOOK_SKEW = 0.9
+MEMBER_SKEW = 0.7
+# Days covered by the generated log, ending today
+HISTORY_DAYS = 3 * 365
+# Chance that a book's latest loan is still open
+OPEN_SHARE = 0.3
+# Most loans one copy can see in HISTORY_DAYS (a loan plus the gap after it
+# average about three weeks); busier books are squeezed into shorter loans
+MAX_LOANS_PER_BOOK = HISTORY_DAYS // 21
+
+
+def _ids(prefix, count):
+    return np.char.add(prefix, np.char.zfill(np.arange(1, count + 1).astype(str), 3))
+
+
+def _pick(rng, words, count):
+    return np.asarray(words, dtype=object)[rng.integers(len(words), size=count)]
+
+
+def _power_law(rng, count, skew):
+    """Normalized power-law weights, shuffled so popularity does not follow ID order."""
+    weights = np.arange(1, count + 1, dtype=float) ** -skew
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _capped(weights, cap):
+    """Caps each weight at `cap`, handing the excess to the others in proportion."""
+    if cap * len(weights) <= 1:
+        return weights
+    weights = weights.copy()
+    for _ in range(50):
+        over = weights > cap
+        excess = (weights[over] - cap).sum()
+        if excess <= 1e-12:
+            break
+        weights[over] = cap
+        under = ~over
+        weights[under] += excess * weights[under] / weights[under].sum()
+    return weights / weights.sum()
+
+
+def make_books(rng, count):
+    titles = _pick(rng, PREFIXES, count) + ' ' + _pick(rng, SUBJECTS, count)
+    # A volume number keeps titles of large catalogues apart
+    volumes = ' Vol ' + rng.integers(1, 9, count).astype(str).astype(object)
+    titles = titles + np.where(rng.random(count) < 0.5, '', volumes)
+    return pd.DataFrame({
+        'BookID': _ids('B', count),
+        'Title': titles,
+        'Author': _pick(rng, FIRST_NAMES, count) + ' ' + _pick(rng, LAST_NAMES, count),
+        'Department': _pick(rng, DEPARTMENTS, count),
+        'Status': 'Available',
+    })[BOOK_COLUMNS]
+
+
+def make_members(rng, count):
+    return pd.DataFrame({
+        'MemberID': _ids('M', count),
+        'Name': _pick(rng, FIRST_NAMES, count) + ' ' + _pick(rng, LAST_NAMES, count),
+        'Role': np.asarray(ROLES, dtype=object)[rng.choice(len(ROLES), size=count, p=ROLE_SHARES)],
+        'Department': _pick(rng, DEPARTMENTS, count),
+        'Batch': rng.integers(2018, 2026, count).astype(str),
+    })[MEMBER_COLUMNS]
+
+
+def make_transactions(rng, books, members, count, today=None):
+    """
+    About `count` Issue/Return rows over HISTORY_DAYS. Returns (log, the
+    BookIDs whose latest loan is open).
+    """
+    today = pd.Timestamp(today or datetime.now()).normalize()
+    loans = max(count // 2, 1)
+    popularity = _capped(_power_law(rng, len(books), BOOK_SKEW), MAX_LOANS_PER_BOOK / loans)
+    per_book = rng.multinomial(loans, popularity)
+    book = np.repeat(np.arange(len(books)), per_book)
+    # Position of each loan in its book's sequence
+    seq = np.arange(len(book)) - np.repeat(np.cumsum(per_book) - per_book, per_book)
+
+    # Loan lengths: mostly about two weeks, with a late tail; gaps between loans
+    length = np.maximum(1, rng.gamma(2.0, 7.0, len(book)).round()).astype(np.int64)
+    gap = rng.geometric(0.2, len(book)).astype(np.int64)
+    span = length + gap
+    # Lay each book's loans out back to back, squeezed into the history
+    # window if needed, ending a (mostly short) idle time before today
+    borrowed = per_book[per_book > 0]
+    first = np.cumsum(borrowed) - borrowed
+    end = np.cumsum(span)
+    end -= np.repeat(end[first] - span[first], borrowed)
+    last = np.zeros(len(book), dtype=bool)
+    last[first + borrowed - 1] = True
+    book_end = np.repeat(end[last], borrowed)
+    before = end - span
+    scale = np.minimum(1.0, HISTORY_DAYS / book_end)
+    used = (book_end * scale).astype(np.int64)
+    start = (before * scale).astype(np.int64)
+    idle = (rng.random(len(books)) ** 4 * HISTORY_DAYS).astype(np.int64)[book]
+    offset = HISTORY_DAYS - used - np.minimum(idle, HISTORY_DAYS - used)
+
+    # The last loan of some books has not been returned yet: those books'
+    # loans are moved so that it started a (mostly short) while ago
+    open_book = (rng.random(len(books)) < OPEN_SHARE)[book]
+    open_loan = last & open_book
+    held = rng.geometric(0.1, len(books))[book]
+    last_start = np.repeat(start[last], borrowed)
+    offset = np.where(open_book, np.maximum(0, HISTORY_DAYS - held - last_start), offset)
+
+    issued_day = start + offset
+    returned_day = np.maximum(issued_day, ((before + length) * scale).astype(np.int64) + offset)
+
+    member = rng.choice(len(members), size=len(book), p=_power_law(rng, len(members), MEMBER_SKEW))
+    closed = ~open_loan
+    events = pd.DataFrame({
+        'book': np.concatenate([book, book[closed]]),
+        'member': np.concatenate([member, np.full(closed.sum(), -1)]),
+        'day': np.concatenate([issued_day, returned_day[closed]]),
+        # Within a book, Issue n < Return n < Issue n + 1
+        'order': np.concatenate([2 * seq, 2 * seq[closed] + 1]),
+        'Action': np.concatenate([np.full(len(book), 'Issue', dtype=object),
+                                  np.full(closed.sum(), 'Return', dtype=object)]),
+    })
+    events = events.sort_values(['day', 'book', 'order'], kind='stable').reset_index(drop=True)
+
+    member_ids = members['MemberID'].to_numpy(dtype=object)
+    log = pd.DataFrame({
+        'TransactionID': _ids('T', len(events)),
+        'BookID': books['BookID'].to_numpy(dtype=object)[events['book']],
+        'MemberID': np.where(events['member'] >= 0, member_ids[events['member'].clip(lower=0)], 'N/A'),
+        'Date': (today - pd.to_timedelta(HISTORY_DAYS - events['day'], unit='D')).dt.strftime(DATE_FORMAT),
+        'Action': events['Action'],
+    })[TRANSACTION_COLUMNS]
+    return log, books['BookID'].to_numpy()[book[open_loan]]
+
+
+def generate(out_dir, rows, books=None, members=None, seed=0, today=None):
+    """
+    Writes a synthetic dataset with about `rows` transactions to `out_dir`
+    (by default rows / 10 books and rows / 50 members). Returns the row
+    count of each table.
+    """
+    rng = np.random.default_rng(seed)
+    books_df = make_books(rng, books or max(rows // 10, 10))
+    members_df = make_members(rng, members or max(rows // 50, 10))
+    log, on_loan = make_transactions(rng, books_df, members_df, rows, today)
+    books_df.loc[books_df['BookID'].isin(on_loan), 'Status'] = 'Issued'
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    counts = {}
+    for table, df in (('books', books_df), ('members', members_df), ('transactions', log)):
+        df.to_csv(out_dir / f'{table}.csv', index=False)
+        counts[table] = len(df)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic library dataset.")
+    parser.add_argument('--rows', type=int, default=100000, help="number of transactions (about)")
+    parser.add_argument('--books', type=int, default=None, help="number of books (default rows / 10)")
+    parser.add_argument('--members', type=int, default=None, help="number of members (default rows / 50)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True, help="directory to write the CSV files to")
+    args = parser.parse_args(argv)
+
+    counts = generate(args.out, args.rows, args.books, args.members, args.seed)
+    for table, count in counts.items():
+        print(f"-> {table}: {count} rows")
+
+
+if __name__ == '__main__':
+    main()